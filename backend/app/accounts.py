@@ -8,8 +8,8 @@ from datetime import datetime, timedelta
 import os
 
 from .db import get_session
-from .security import verify_token
-from .models import SharedAccount, AccountMember, AccountInvite, User, Expense, CostCenter, Category
+from .security import get_current_identity, TokenData
+from .models import SharedAccount, AccountMember, AccountInvite, InviteStatus, User, Expense, CostCenter, Category
 from .invite_manager import invite_manager
 from .notification_service import notification_service
 
@@ -86,7 +86,7 @@ def get_user_accounts(user_id: int, session: Session):
 async def create_shared_account(
     account_data: dict,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Cria uma nova conta compartilhada"""
     try:
@@ -97,7 +97,7 @@ async def create_shared_account(
         # Verificar se já existe conta com mesmo nome para este usuário
         existing_account = session.execute(
             select(SharedAccount).where(
-                SharedAccount.owner_id == current_user["user_id"],
+                SharedAccount.owner_id == current_user.user_id,
                 SharedAccount.name == name,
                 SharedAccount.is_active == True
             )
@@ -109,7 +109,7 @@ async def create_shared_account(
         # Criar conta
         account = SharedAccount(
             name=name,
-            owner_id=current_user["user_id"]
+            owner_id=current_user.user_id
         )
         session.add(account)
         session.commit()
@@ -118,7 +118,7 @@ async def create_shared_account(
         # Adicionar criador como membro owner
         owner_member = AccountMember(
             account_id=account.id,
-            user_id=current_user["user_id"],
+            user_id=current_user.user_id,
             role="owner"
         )
         session.add(owner_member)
@@ -148,11 +148,11 @@ async def create_shared_account(
 @router.get("/api/users/accounts")
 async def get_user_accounts_list(
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Retorna todas as contas do usuário"""
     try:
-        accounts = get_user_accounts(current_user["user_id"], session)
+        accounts = get_user_accounts(current_user.user_id, session)
         return {"accounts": accounts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar contas: {str(e)}")
@@ -161,11 +161,11 @@ async def get_user_accounts_list(
 async def get_account_details(
     account_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Retorna detalhes de uma conta específica"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session):
+        if not check_account_access(account_id, current_user.user_id, session):
             raise HTTPException(status_code=403, detail="Acesso negado")
         
         account = session.get(SharedAccount, account_id)
@@ -241,11 +241,11 @@ async def update_account(
     account_id: int,
     account_data: dict,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Atualiza informações da conta (apenas owner/admin)"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session, "admin"):
+        if not check_account_access(account_id, current_user.user_id, session, "admin"):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
         account = session.get(SharedAccount, account_id)
@@ -287,7 +287,7 @@ async def update_account(
 async def delete_account(
     account_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Exclui uma conta compartilhada (apenas owner)"""
     try:
@@ -296,7 +296,7 @@ async def delete_account(
             raise HTTPException(status_code=404, detail="Conta não encontrada")
         
         # Verificar se é o owner
-        if account.owner_id != current_user["user_id"]:
+        if account.owner_id != current_user.user_id:
             raise HTTPException(status_code=403, detail="Apenas o proprietário pode excluir a conta")
         
         # Marcar conta como inativa (soft delete)
@@ -314,12 +314,12 @@ async def delete_account(
         pending_invites = session.execute(
             select(AccountInvite).where(
                 AccountInvite.account_id == account_id,
-                AccountInvite.status == "pending"
+                AccountInvite.status == InviteStatus.PENDING.value
             )
         ).all()
         
         for invite in pending_invites:
-            invite.status = "cancelled"
+            invite.status = InviteStatus.CANCELLED.value
         
         session.commit()
         
@@ -337,15 +337,15 @@ async def update_member_role(
     member_user_id: int,
     member_data: dict,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Atualiza role de um membro (apenas owner/admin)"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session, "admin"):
+        if not check_account_access(account_id, current_user.user_id, session, "admin"):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
         # Não permitir que admin altere owner
-        if member_user_id == current_user["user_id"]:
+        if member_user_id == current_user.user_id:
             raise HTTPException(status_code=400, detail="Não é possível alterar sua própria role")
         
         account = session.get(SharedAccount, account_id)
@@ -384,15 +384,15 @@ async def remove_member(
     account_id: int,
     member_user_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Remove um membro da conta (apenas owner/admin)"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session, "admin"):
+        if not check_account_access(account_id, current_user.user_id, session, "admin"):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
         # Não permitir remover a si mesmo
-        if member_user_id == current_user["user_id"]:
+        if member_user_id == current_user.user_id:
             raise HTTPException(status_code=400, detail="Não é possível remover a si mesmo")
         
         account = session.get(SharedAccount, account_id)
@@ -427,7 +427,7 @@ async def remove_member(
 async def leave_account(
     account_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Sai de uma conta compartilhada"""
     try:
@@ -436,13 +436,13 @@ async def leave_account(
             raise HTTPException(status_code=404, detail="Conta não encontrada")
         
         # Verificar se é o owner
-        if account.owner_id == current_user["user_id"]:
+        if account.owner_id == current_user.user_id:
             raise HTTPException(status_code=400, detail="Proprietário não pode sair da conta. Transfira a propriedade ou exclua a conta.")
         
         member = session.execute(
             select(AccountMember).where(
                 AccountMember.account_id == account_id,
-                AccountMember.user_id == current_user["user_id"],
+                AccountMember.user_id == current_user.user_id,
                 AccountMember.is_active == True
             )
         ).first()
@@ -470,11 +470,11 @@ async def create_invite(
     account_id: int,
     invite_data: dict,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Cria um convite para uma conta compartilhada - SISTEMA INTERNO"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session, "admin"):
+        if not check_account_access(account_id, current_user.user_id, session, "admin"):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
         email = invite_data.get("email")
@@ -491,7 +491,7 @@ async def create_invite(
             select(AccountInvite).where(
                 AccountInvite.account_id == account_id,
                 AccountInvite.email == email,
-                AccountInvite.status == "pending"
+                AccountInvite.status == InviteStatus.PENDING.value
             )
         ).first()
         
@@ -513,7 +513,7 @@ async def create_invite(
         
         # Usar InviteManager para criar o convite
         invite, message = invite_manager.create_invite(
-            account_id, email, role, current_user["user_id"], session
+            account_id, email, role, current_user.user_id, session
         )
         
         if not invite:
@@ -521,7 +521,7 @@ async def create_invite(
         
         # Buscar informações para notificação
         account = session.get(SharedAccount, account_id)
-        inviter = session.get(User, current_user["user_id"])
+        inviter = session.get(User, current_user.user_id)
         
         # Criar notificação/internal log
         notification_service.create_invite_notification(
@@ -609,7 +609,7 @@ async def get_invite_share_info(
 async def accept_invite(
     token: str,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Aceita um convite para conta compartilhada"""
     try:
@@ -625,7 +625,7 @@ async def accept_invite(
         account = validation_result["account"]
         
         # Verificar se o email do convite corresponde ao usuário logado
-        if invite.email != current_user["email"]:
+        if invite.email != current_user.email:
             raise HTTPException(
                 status_code=403, 
                 detail="Este convite não é para seu email"
@@ -635,15 +635,15 @@ async def accept_invite(
         existing_member = session.execute(
             select(AccountMember).where(
                 AccountMember.account_id == invite.account_id,
-                AccountMember.user_id == current_user["user_id"],
+                AccountMember.user_id == current_user.user_id,
                 AccountMember.is_active == True
             )
         ).first()
         
         if existing_member:
             # Marcar convite como aceito mesmo que já seja membro
-            invite.status = "accepted"
-            invite.accepted_by = current_user["user_id"]
+            invite.status = InviteStatus.ACCEPTED.value
+            invite.accepted_by = current_user.user_id
             invite.accepted_at = datetime.utcnow()
             session.commit()
             
@@ -656,13 +656,13 @@ async def accept_invite(
         # Adicionar como novo membro
         new_member = AccountMember(
             account_id=invite.account_id,
-            user_id=current_user["user_id"],
+            user_id=current_user.user_id,
             role=invite.role
         )
         
         # Atualizar convite
-        invite.status = "accepted"
-        invite.accepted_by = current_user["user_id"]
+        invite.status = InviteStatus.ACCEPTED.value
+        invite.accepted_by = current_user.user_id
         invite.accepted_at = datetime.utcnow()
         
         session.add(new_member)
@@ -685,7 +685,7 @@ async def accept_invite(
 async def cancel_invite(
     invite_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Cancela um convite pendente"""
     try:
@@ -695,16 +695,16 @@ async def cancel_invite(
         
         # Verificar permissão (apenas admin da conta ou quem criou)
         account = session.get(SharedAccount, invite.account_id)
-        is_admin = check_account_access(invite.account_id, current_user["user_id"], session, "admin")
-        is_creator = invite.created_by == current_user["user_id"]
+        is_admin = check_account_access(invite.account_id, current_user.user_id, session, "admin")
+        is_creator = invite.created_by == current_user.user_id
         
         if not (is_admin or is_creator):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
-        if invite.status != "pending":
+        if invite.status != InviteStatus.PENDING.value:
             raise HTTPException(status_code=400, detail="Convite não pode ser cancelado")
         
-        invite.status = "cancelled"
+        invite.status = InviteStatus.CANCELLED.value
         session.commit()
         
         return {"status": "success", "message": "Convite cancelado com sucesso"}
@@ -719,11 +719,11 @@ async def cancel_invite(
 async def get_account_invites(
     account_id: int,
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Retorna todos os convites de uma conta"""
     try:
-        if not check_account_access(account_id, current_user["user_id"], session, "admin"):
+        if not check_account_access(account_id, current_user.user_id, session, "admin"):
             raise HTTPException(status_code=403, detail="Permissão insuficiente")
         
         invites = session.execute(
@@ -749,7 +749,7 @@ async def get_account_invites(
                 "inviter_name": inviter.name,
                 "accepted_at": invite.accepted_at.isoformat() if invite.accepted_at else None,
                 "accepted_by_name": accepted_by_user.name if accepted_by_user else None,
-                "token": invite.token if invite.status == "pending" else None  # Só mostrar token para convites pendentes
+                "token": invite.token if invite.status == InviteStatus.PENDING.value else None  # Só mostrar token para convites pendentes
             })
         
         return {"invites": invites_data}
@@ -760,11 +760,11 @@ async def get_account_invites(
 @router.get("/api/users/pending-invites")
 async def get_user_pending_invites(
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Retorna convites pendentes para o usuário atual"""
     try:
-        pending_invites = invite_manager.get_user_pending_invites(current_user["email"], session)
+        pending_invites = invite_manager.get_user_pending_invites(current_user.email, session)
         return {"pending_invites": pending_invites}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar convites pendentes: {str(e)}")
@@ -774,7 +774,7 @@ async def get_user_pending_invites(
 @router.post("/api/admin/cleanup-expired-invites")
 async def cleanup_expired_invites(
     session: Session = Depends(get_session),
-    current_user: dict = Depends(verify_token)
+    current_user: TokenData = Depends(get_current_identity)
 ):
     """Limpa convites expirados (apenas para admin/desenvolvimento)"""
     try:
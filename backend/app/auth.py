@@ -3,8 +3,8 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import RedirectResponse, JSONResponse
 from sqlmodel import Session, select
 import os
-import requests
 import secrets
+from urllib.parse import quote
 from datetime import datetime, timedelta
 import logging
 
@@ -13,7 +13,7 @@ from sqlalchemy.future import select as select_sa
 
 # IMPORTANTE: Garanta que essas importações estejam corretas no seu projeto
 from .db import get_session
-from .security import create_user_token, verify_token
+from .security import create_user_token, verify_token_async, get_cached_user, forget_cached_user, rate_limiter, get_http_client, credentials_exception
 from .models import User, UserType 
 
 router = APIRouter()
@@ -73,7 +73,7 @@ async def google_login(request: Request):
         }
 
         auth_url = "https://accounts.google.com/o/oauth2/v2/auth?" + "&".join(
-            [f"{k}={requests.utils.quote(v)}" for k, v in auth_params.items()]
+            [f"{k}={quote(v)}" for k, v in auth_params.items()]
         )
 
         logger.info("Redirecionando para Google OAuth")
@@ -86,7 +86,7 @@ async def google_login(request: Request):
             content={"error": "Serviço de autenticação indisponível"}
         )
 
-@router.get("/google/callback")
+@router.get("/google/callback", dependencies=[Depends(rate_limiter("google_callback"))])
 async def google_callback(
     code: str = None,
     state: str = None,
@@ -133,7 +133,7 @@ async def google_callback(
         logger.info("Trocando código por token...")
 
         # Exchange code for token
-        token_response = requests.post(
+        token_response = await get_http_client().post(
             "https://oauth2.googleapis.com/token",
             data={
                 "client_id": client_id,
@@ -162,7 +162,7 @@ async def google_callback(
         logger.info("Access token obtido")
 
         # Get user info
-        userinfo_response = requests.get(
+        userinfo_response = await get_http_client().get(
             "https://www.googleapis.com/oauth2/v3/userinfo",
             headers={"Authorization": f"Bearer {access_token}"},
             timeout=30
@@ -217,6 +217,7 @@ async def google_callback(
 
         session.commit()
         session.refresh(user)
+        forget_cached_user(user.id)
 
         # Create JWT token
         jwt_token = create_user_token(user)
@@ -233,7 +234,7 @@ async def google_callback(
         # Em caso de erro, você está redirecionando para o frontend com um parâmetro de erro.
         return RedirectResponse(f"{get_frontend_url()}?auth_error=server_error")
 
-@router.get("/verify")
+@router.get("/verify", dependencies=[Depends(rate_limiter("auth_verify"))])
 async def verify_token_endpoint(
     token: str = None,
     session: Session = Depends(get_session)
@@ -243,12 +244,12 @@ async def verify_token_endpoint(
         if not token:
             raise HTTPException(status_code=400, detail="Token necessário")
         
-        payload = verify_token(token)
-        if not payload:
-            raise HTTPException(status_code=401, detail="Token inválido")
+        token_data = await verify_token_async(token)
+        if not token_data:
+            raise credentials_exception("Token inválido")
         
-        # session.get() é o método síncrono e correto para busca por PK
-        user = session.get(User, payload.get("user_id")) 
+        # Busca por PK com cache curto (evita um SELECT a cada verificação)
+        user = get_cached_user(session, token_data.user_id, token_data.email)
 
         if not user:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -269,7 +270,7 @@ async def verify_token_endpoint(
         raise e
     except Exception as e:
         logger.error(f"Erro na verificação do token: {str(e)}")
-        raise HTTPException(status_code=401, detail="Falha na verificação do token")
+        raise credentials_exception("Falha na verificação do token")
 
 # Cleanup function
 def cleanup_expired_states():
@@ -0,0 +1,131 @@
+# backend/app/cache.py
+import os
+import json
+import functools
+from typing import Optional
+import threading
+import logging
+import redis
+from cachetools import TTLCache
+from sqlmodel import Session, select, func
+
+from .models import Expense
+
+logger = logging.getLogger(__name__)
+
+# Janela máxima de resposta desatualizada. A chave (max(id), count) não detecta edições;
+# elas dependem de invalidate_user(), que só alcança outros workers via versão no Redis.
+CACHE_TTL_SECONDS = 60
+
+# Segundo nível compartilhado entre workers (opcional: só com REDIS_URL definida)
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Vários workers sem Redis: a invalidação limparia só o cache local de quem fez a escrita
+# e os demais serviriam totais antigos por até CACHE_TTL_SECONDS. Nesse caso não cacheia.
+MULTI_WORKER = int(os.getenv("WEB_CONCURRENCY") or 1) > 1
+CACHE_ENABLED = bool(REDIS_URL) or not MULTI_WORKER
+_redis_client = None
+
+# Caches registrados por endpoint (usados na invalidação manual)
+_caches = []
+_lock = threading.Lock()
+_MISSING = object()
+
+def get_redis():
+    """Cliente Redis compartilhado, ou None se não configurado"""
+    global _redis_client
+    if _redis_client is None and REDIS_URL:
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _redis_client
+
+def _version_key(user_id: int) -> str:
+    return f"user:{user_id}:expenses_version"
+
+def get_user_version(user_id: int) -> Optional[int]:
+    """Versão das despesas do usuário no Redis (0 sem Redis, None se o Redis falhar)"""
+    client = get_redis()
+    if client is None:
+        return 0
+    try:
+        return int(client.get(_version_key(user_id)) or 0)
+    except redis.RedisError as e:
+        logger.warning(f"Redis indisponível, ignorando cache distribuído: {e}")
+        return None
+
+def user_state_signature(session: Session, user_id: int):
+    """Assinatura barata do estado das despesas do usuário: (max(id), count(id))"""
+    return tuple(session.execute(
+        select(func.max(Expense.id), func.count(Expense.id)).where(Expense.user_id == user_id)
+    ).one())
+
+def cached_by_user_state(endpoint):
+    """
+    Cacheia a resposta de um endpoint de dashboard por (user_id, versão, max(id), count).
+
+    Primeiro nível em memória (TTLCache), segundo nível no Redis para que todos
+    os workers compartilhem o resultado. Novas despesas ou exclusões mudam a
+    assinatura; edições devem chamar invalidate_user(), que incrementa a versão.
+    Desligado com vários workers quando não há Redis ou ele não responde.
+    """
+    cache = TTLCache(maxsize=1024, ttl=CACHE_TTL_SECONDS)
+    _caches.append(cache)
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if not CACHE_ENABLED:
+            return endpoint(*args, **kwargs)
+
+        user_id = kwargs["user_id"]
+        session = kwargs["session"]
+        version = get_user_version(user_id)
+        if version is None:
+            # Redis fora do ar: com vários workers a versão não propaga invalidações,
+            # então o cache local serviria totais antigos. Consulta direto.
+            if MULTI_WORKER:
+                return endpoint(*args, **kwargs)
+            version = 0
+        key = (user_id, version, *user_state_signature(session, user_id))
+
+        with _lock:
+            result = cache.get(key, _MISSING)
+        if result is not _MISSING:
+            return result
+
+        client = get_redis()
+        redis_key = f"dashboard:{user_id}:{endpoint.__name__}:" + ":".join(str(part) for part in key[1:])
+        if client is not None:
+            try:
+                cached = client.get(redis_key)
+                if cached is not None:
+                    result = json.loads(cached)
+                    with _lock:
+                        cache[key] = result
+                    return result
+            except redis.RedisError as e:
+                logger.warning(f"Falha ao ler cache do Redis: {e}")
+
+        result = endpoint(*args, **kwargs)
+        with _lock:
+            cache[key] = result
+        if client is not None:
+            try:
+                client.setex(redis_key, CACHE_TTL_SECONDS, json.dumps(result))
+            except redis.RedisError as e:
+                logger.warning(f"Falha ao gravar cache no Redis: {e}")
+        return result
+
+    return wrapper
+
+def invalidate_user(user_id: int):
+    """Remove as respostas cacheadas de um usuário e incrementa sua versão no Redis"""
+    with _lock:
+        for cache in _caches:
+            for key in [k for k in cache.keys() if k[0] == user_id]:
+                cache.pop(key, None)
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.incr(_version_key(user_id))
+        except redis.RedisError as e:
+            logger.warning(f"Falha ao invalidar cache no Redis: {e}")
@@ -1,12 +1,13 @@
 # backend/app/db.py
 from sqlmodel import create_engine, SQLModel, Session
 import os
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, raiseload
 from typing import Generator
 from sqlalchemy.pool import StaticPool
 import logging
 # ⭐️ Importação necessária para usar text() ⭐️
-from sqlalchemy import text 
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import make_url
 
 logger = logging.getLogger(__name__)
 
@@ -40,20 +41,62 @@ if DATABASE_URL.startswith('sqlite'):
     logger.info("✅ Engine SQLite criada")
 else:
     # Configuração para PostgreSQL (Railway)
+    # psycopg2: executemany em lote também para UPDATE/DELETE (INSERTs já usam insertmanyvalues)
+    dialect_args = {"executemany_mode": "values_plus_batch"} if make_url(DATABASE_URL).get_driver_name() == "psycopg2" else {}
     engine = create_engine(
         DATABASE_URL,
         echo=False,
         pool_pre_ping=True, # Reconecta automaticamente
         pool_recycle=300, # Evita conexões stale
+        pool_size=int(os.getenv("DB_POOL_SIZE", "8")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "16")),
+        **dialect_args,
     )
     logger.info("✅ Engine PostgreSQL criada")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Fora de produção qualquer lazy load não declarado levanta erro na hora
+STRICT_LOADING = os.getenv("ENVIRONMENT", "development") != "production"
+
+def lazyload_guard():
+    """Opções de query que proíbem lazy loads implícitos (apenas dev/testes)"""
+    return (raiseload("*"),) if STRICT_LOADING else ()
+
+# Colunas adicionadas após a criação das tabelas (o projeto não usa migrations):
+# (tabela, coluna, DDL, backfill opcional)
+ADDED_COLUMNS = [
+    (
+        "expense", "installments_count", "INTEGER NOT NULL DEFAULT 0",
+        "UPDATE expense SET installments_count = "
+        "(SELECT count(*) FROM installment WHERE installment.expense_id = expense.id)"
+    ),
+]
+
+def ensure_added_columns():
+    """Adiciona em tabelas existentes as colunas criadas depois do deploy inicial"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column, ddl, backfill in ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            if backfill:
+                conn.execute(text(backfill))
+            logger.info(f"✅ Coluna {table}.{column} adicionada")
+
 def init_db():
     """Inicializa o banco de dados com tratamento de erro"""
     try:
         SQLModel.metadata.create_all(bind=engine)
+        ensure_added_columns()
+        # create_all não adiciona índices novos em tabelas que já existem
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
         logger.info("✅ Banco de dados inicializado com sucesso")
         return True
     except Exception as e:
@@ -4,9 +4,11 @@ import string
 import logging
 from datetime import datetime, timedelta
 from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
 from typing import List, Dict, Optional, Tuple
 
-from .models import AccountInvite, SharedAccount, User, AccountMember
+from .models import AccountInvite, InviteStatus, User, AccountMember
+from .db import lazyload_guard
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +32,7 @@ class InviteManager:
                 select(AccountInvite).where(
                     AccountInvite.account_id == account_id,
                     AccountInvite.email == email,
-                    AccountInvite.status == "pending"
+                    AccountInvite.status == InviteStatus.PENDING.value
                 )
             ).first()
             
@@ -64,7 +66,7 @@ class InviteManager:
                 role=role,
                 expires_at=datetime.utcnow() + timedelta(days=self.default_expiry_days),
                 created_by=created_by,
-                status="pending"
+                status=InviteStatus.PENDING.value
             )
             
             session.add(invite)
@@ -82,24 +84,27 @@ class InviteManager:
     def validate_invite_token(self, token: str, session: Session) -> Dict:
         """Valida token de convite e retorna informações"""
         try:
-            result = session.execute(
-                select(AccountInvite, SharedAccount, User)
-                .join(SharedAccount, AccountInvite.account_id == SharedAccount.id)
-                .join(User, AccountInvite.created_by == User.id)
+            invite_obj = session.execute(
+                select(AccountInvite)
+                .options(
+                    selectinload(AccountInvite.account),
+                    selectinload(AccountInvite.creator),
+                    *lazyload_guard()
+                )
                 .where(AccountInvite.token == token)
-            ).first()
+            ).scalar_one_or_none()
             
-            if not result:
+            if not invite_obj or invite_obj.account is None or invite_obj.creator is None:
                 return {
                     "valid": False, 
                     "error": "Convite não encontrado",
                     "error_code": "INVITE_NOT_FOUND"
                 }
             
-            invite_obj, account, inviter = result
+            account, inviter = invite_obj.account, invite_obj.creator
             
             # Verificar status
-            if invite_obj.status != "pending":
+            if invite_obj.status != InviteStatus.PENDING.value:
                 return {
                     "valid": False,
                     "error": "Convite já utilizado",
@@ -108,7 +113,7 @@ class InviteManager:
             
             # Verificar expiração
             if invite_obj.expires_at < datetime.utcnow():
-                invite_obj.status = "expired"
+                invite_obj.status = InviteStatus.EXPIRED.value
                 session.commit()
                 return {
                     "valid": False,
@@ -240,7 +245,7 @@ class InviteManager:
             
             if existing_member:
                 # Marcar convite como aceito mesmo que já seja membro
-                invite.status = "accepted"
+                invite.status = InviteStatus.ACCEPTED.value
                 invite.accepted_at = datetime.utcnow()
                 session.commit()
                 
@@ -260,7 +265,7 @@ class InviteManager:
             session.add(member)
             
             # Atualizar status do convite
-            invite.status = "accepted"
+            invite.status = InviteStatus.ACCEPTED.value
             invite.accepted_at = datetime.utcnow()
             
             session.commit()
@@ -287,19 +292,26 @@ class InviteManager:
     def get_user_pending_invites(self, user_email: str, session: Session) -> List[Dict]:
         """Retorna todos os convites pendentes de um usuário"""
         try:
+            now = datetime.utcnow()
             invites = session.execute(
-                select(AccountInvite, SharedAccount, User)
-                .join(SharedAccount, AccountInvite.account_id == SharedAccount.id)
-                .join(User, AccountInvite.created_by == User.id)
+                select(AccountInvite)
+                .options(
+                    selectinload(AccountInvite.account),
+                    selectinload(AccountInvite.creator),
+                    *lazyload_guard()
+                )
                 .where(
                     AccountInvite.email == user_email,
-                    AccountInvite.status == "pending",
-                    AccountInvite.expires_at > datetime.utcnow()
+                    AccountInvite.status == InviteStatus.PENDING.value,
+                    AccountInvite.expires_at > now
                 )
-            ).all()
+            ).scalars().all()
             
             result = []
-            for invite_obj, account, inviter in invites:
+            for invite_obj in invites:
+                account, inviter = invite_obj.account, invite_obj.creator
+                if account is None or inviter is None:
+                    continue
                 result.append({
                     "id": invite_obj.id,
                     "token": invite_obj.token,
@@ -310,7 +322,7 @@ class InviteManager:
                     "role": invite_obj.role,
                     "expires_at": invite_obj.expires_at.isoformat(),
                     "created_at": invite_obj.created_at.isoformat(),
-                    "days_remaining": (invite_obj.expires_at - datetime.utcnow()).days
+                    "days_remaining": (invite_obj.expires_at - now).days
                 })
             
             return result
@@ -326,10 +338,10 @@ class InviteManager:
             if not invite:
                 return False
             
-            if invite.status != "pending":
+            if invite.status != InviteStatus.PENDING.value:
                 return False
             
-            invite.status = "cancelled"
+            invite.status = InviteStatus.CANCELLED.value
             session.commit()
             
             logger.info(f"✅ Convite cancelado: {invite.token}")
@@ -345,14 +357,14 @@ class InviteManager:
         try:
             expired_invites = session.execute(
                 select(AccountInvite).where(
-                    AccountInvite.status == "pending",
+                    AccountInvite.status == InviteStatus.PENDING.value,
                     AccountInvite.expires_at < datetime.utcnow()
                 )
             ).all()
             
             count = 0
             for invite in expired_invites:
-                invite.status = "expired"
+                invite.status = InviteStatus.EXPIRED.value
                 count += 1
             
             if count > 0:
@@ -0,0 +1,32 @@
+# backend/app/logging_config.py
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+
+def setup_logging(level: int = logging.INFO):
+    """
+    Configura o logging da aplicação sem I/O no caminho da requisição
+
+    Os handlers do root só enfileiram o registro (QueueHandler); a escrita no
+    stdout acontece na thread do QueueListener. Chamadas repetidas não fazem nada.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Esvazia a fila antes de o processo terminar
+    atexit.register(_listener.stop)
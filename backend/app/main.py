@@ -1,26 +1,43 @@
 # backend/app/main.py
 from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select, func, extract
 from datetime import datetime, timedelta
 from typing import Optional, List
+import asyncio
 import logging
 from dateutil.relativedelta import relativedelta
 import io
 import csv
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from sqlalchemy import and_, case, insert
 
 from app.models import User, Expense, CostCenter, Category, Installment, PaymentStatus, UserType, SharedAccount, AccountMember, AccountInvite
-from app.db import get_session, init_db, check_database_connection
-from app.nlu.transcribe import transcribe_and_extract
+from app.logging_config import setup_logging
+from app.db import get_session, init_db, check_database_connection, lazyload_guard, SessionLocal
+from app.cache import cached_by_user_state, invalidate_user
+from app.security import forget_cached_user, rate_limiter, close_http_client
+from app.nlu.transcribe import transcribe_audio_async, extract_expense, fallback_result, warmup_asr, shutdown_asr_executor
 from app.accounts import router as accounts_router
 from app.auth import router as auth_router
 
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="VoiceExpense API", version="1.0.0")
+app = FastAPI(title="VoiceExpense API", version="1.0.0", default_response_class=ORJSONResponse)
+
+def _csv_header_bytes(columns: List[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue().encode('utf-8')
+
+# Cabeçalho fixo da exportação, codificado uma única vez
+_CSV_HEADER = _csv_header_bytes([
+    'Data', 'Centro de Custo', 'Categoria', 'Descrição',
+    'Valor (R$)', 'Forma de Pagamento', 'Parcelas', 'Conta Compartilhada'
+])
 
 # CORS CONFIGURADO CORRETAMENTE
 app.add_middleware(
@@ -57,6 +74,23 @@ def on_startup():
         logger.error(f"❌ Erro na inicialização: {e}")
         # App continua rodando mesmo com erro no banco
 
+@app.on_event("startup")
+async def warm_whisper_model():
+    """Sobe o executor de ASR e carrega o Whisper nele, para a primeira transcrição não pagar o cold start"""
+    try:
+        await warmup_asr()
+    except Exception as e:
+        logger.error(f"❌ Erro ao aquecer modelo Whisper: {e}")
+        # O modelo será carregado sob demanda na primeira transcrição
+
+@app.on_event("shutdown")
+def stop_asr_executor():
+    shutdown_asr_executor()
+
+@app.on_event("shutdown")
+async def stop_http_client():
+    await close_http_client()
+
 # ===== UTILITÁRIOS =====
 
 def get_date_filters(start_date: Optional[str], end_date: Optional[str]):
@@ -74,6 +108,13 @@ def get_date_filters(start_date: Optional[str], end_date: Optional[str]):
     
     return start_dt, end_dt
 
+def get_names_by_id(session: Session, model, ids) -> dict:
+    """Busca de uma vez os nomes de um conjunto de IDs (evita session.get por linha)"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return dict(session.execute(select(model.id, model.name).where(model.id.in_(ids))).all())
+
 # ===== ENDPOINTS DE USUÁRIO =====
 
 @app.post("/api/users")
@@ -94,6 +135,7 @@ async def create_or_update_user(user_data: dict, session: Session = Depends(get_
             session.add(existing_user)
             session.commit()
             session.refresh(existing_user)
+            forget_cached_user(existing_user.id)
             return existing_user
         else:
             # Criar novo usuário
@@ -204,6 +246,7 @@ async def complete_onboarding(onboarding_data: dict, session: Session = Depends(
                 session.add(category)
         
         session.commit()
+        forget_cached_user(user_id)
         
         return {"status": "success", "message": "Onboarding completado com sucesso"}
         
@@ -214,7 +257,19 @@ async def complete_onboarding(onboarding_data: dict, session: Session = Depends(
 
 # ===== ENDPOINTS DE ÁUDIO E PROCESSAMENTO =====
 
-@app.post("/api/audio")
+def _load_user_nlu_config(session: Session, user_id: int):
+    """Nomes de centros de custo e categorias do usuário para o NLP (None se o usuário não existe)"""
+    if session.get(User, user_id) is None:
+        return None
+    cost_center_names = list(session.execute(
+        select(CostCenter.name).where(CostCenter.user_id == user_id)
+    ).scalars().all())
+    category_names = list(session.execute(
+        select(Category.name).where(Category.user_id == user_id)
+    ).scalars().all())
+    return cost_center_names, category_names
+
+@app.post("/api/audio", dependencies=[Depends(rate_limiter("audio"))])
 async def process_audio(
     file: UploadFile = File(...),
     user_id: int = Query(...),
@@ -222,46 +277,37 @@ async def process_audio(
 ):
     """Processa áudio e extrai informações da despesa"""
     try:
-        # Salvar arquivo temporariamente
-        import tempfile
-        import os
+        content = await file.read()
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
-            content = await file.read()
-            temp_audio.write(content)
-            temp_path = temp_audio.name
+        # Transcrição no executor de ASR, em paralelo com a busca das configurações do usuário.
+        # As consultas (síncronas) vão para o threadpool: o event loop fica livre para
+        # submeter a transcrição e atender outras requests enquanto elas rodam.
+        transcription = asyncio.create_task(transcribe_audio_async(content))
         
         try:
-            # Buscar configurações do usuário para NLP
-            user = session.get(User, user_id)
-            if not user:
+            user_config = await run_in_threadpool(_load_user_nlu_config, session, user_id)
+            if user_config is None:
                 raise HTTPException(status_code=404, detail="Usuário não encontrado")
+            cost_center_names, category_names = user_config
+        except BaseException:
+            transcription.cancel()
+            raise
+        
+        # Processar áudio
+        try:
+            raw_text = await transcription
+            result = extract_expense(raw_text, cost_center_names, category_names)
+        except Exception as e:
+            logger.error(f"❌ Erro na transcrição: {e}")
+            result = fallback_result(cost_center_names, category_names)
+        
+        logger.info(f"Processamento concluído para usuário {user_id}: {result}")
+        
+        # orjson serializa o dataclass (slots) e os datetimes direto, sem passar pelo jsonable_encoder
+        return ORJSONResponse(result)
             
-            cost_centers = session.execute(
-                select(CostCenter).where(CostCenter.user_id == user_id)
-            ).scalars().all()
-            categories = session.execute(
-                select(Category).where(Category.user_id == user_id)
-            ).scalars().all()
-            
-            cost_center_names = [cc.name for cc in cost_centers]
-            category_names = [cat.name for cat in categories]
-            
-            # Processar áudio
-            result = transcribe_and_extract(
-                temp_path, 
-                cost_center_names, 
-                category_names
-            )
-            
-            logger.info(f"Processamento concluído para usuário {user_id}: {result}")
-            
-            return result
-            
-        finally:
-            # Limpar arquivo temporário
-            os.unlink(temp_path)
-            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Erro ao processar áudio")
         raise HTTPException(status_code=500, detail=str(e))
@@ -318,32 +364,26 @@ async def get_expenses(
             query.order_by(Expense.transaction_date.desc())
         ).scalars().all()
         
+        cost_center_names = get_names_by_id(session, CostCenter, (e.cost_center_id for e in expenses))
+        category_names = get_names_by_id(session, Category, (e.category_id for e in expenses))
+        shared_account_names = get_names_by_id(session, SharedAccount, (e.shared_account_id for e in expenses))
+        
         result = []
         for expense in expenses:
-            cost_center = session.get(CostCenter, expense.cost_center_id)
-            category = session.get(Category, expense.category_id)
-            installments = session.execute(
-                select(Installment).where(Installment.expense_id == expense.id)
-            ).scalars().all()
-            
-            shared_account = None
-            if expense.shared_account_id:
-                shared_account = session.get(SharedAccount, expense.shared_account_id)
-            
             result.append({
                 "id": expense.id,
                 "description": expense.description,
                 "total_amount": expense.total_amount,
                 "payment_method": expense.payment_method,
-                "cost_center": cost_center.name if cost_center else "N/A",
-                "category": category.name if category else "N/A",
-                "installments": len(installments),
+                "cost_center": cost_center_names.get(expense.cost_center_id, "N/A"),
+                "category": category_names.get(expense.category_id, "N/A"),
+                "installments": expense.installments_count,
                 "created_at": expense.transaction_date.isoformat(),
                 "text": expense.description,
                 "cost_center_id": expense.cost_center_id,
                 "category_id": expense.category_id,
                 "shared_account_id": expense.shared_account_id,
-                "shared_account_name": shared_account.name if shared_account else None
+                "shared_account_name": shared_account_names.get(expense.shared_account_id)
             })
         
         return result
@@ -431,12 +471,12 @@ async def create_expense(expense_data: dict, session: Session = Depends(get_sess
             category_id=category_id,
             transaction_date=expense_data.get("transaction_date", datetime.utcnow()),
             is_installment=num_installments > 1,
+            installments_count=len(installments_data) if installments_data and isinstance(installments_data, list) else 1,
             shared_account_id=shared_account_id
         )
         
         session.add(expense)
-        session.commit()
-        session.refresh(expense)
+        session.flush()  # gera expense.id sem commit nem SELECT extra
         
         # Criar parcelas se necessário
         if installments_data and isinstance(installments_data, list):
@@ -468,6 +508,7 @@ async def create_expense(expense_data: dict, session: Session = Depends(get_sess
             session.add(installment)
         
         session.commit()
+        await run_in_threadpool(invalidate_user, expense_data["user_id"])
         
         return expense
         
@@ -525,6 +566,7 @@ async def update_expense(expense_id: int, expense_data: dict, session: Session =
         session.add(expense)
         session.commit()
         session.refresh(expense)
+        await run_in_threadpool(invalidate_user, expense.user_id)
         
         return expense
         
@@ -548,8 +590,10 @@ async def delete_expense(expense_id: int, session: Session = Depends(get_session
         for installment in installments:
             session.delete(installment)
         
+        user_id = expense.user_id
         session.delete(expense)
         session.commit()
+        await run_in_threadpool(invalidate_user, user_id)
         
         return {"status": "success", "message": "Despesa excluída com sucesso"}
         
@@ -786,7 +830,7 @@ async def get_monthly_expenses(
             Expense.user_id == user_id,
             Expense.transaction_date >= start_dt,
             Expense.transaction_date <= end_dt
-        )
+        ).options(*lazyload_guard())
         
         # Filtrar por conta compartilhada se especificado
         if shared_account_id:
@@ -804,7 +848,7 @@ async def get_monthly_expenses(
                 "category": category.name,
                 "payment_method": expense.payment_method,
                 "transaction_date": expense.transaction_date.isoformat(),
-                "installments": len(expense.installments)
+                "installments": expense.installments_count
             })
         
         total_amount = sum(exp["amount"] for exp in result)
@@ -831,23 +875,34 @@ async def export_expenses_to_excel(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     cost_center: Optional[str] = Query(None),
-    shared_account_id: Optional[int] = Query(None),
-    session: Session = Depends(get_session)
+    shared_account_id: Optional[int] = Query(None)
 ):
     """Exporta despesas para CSV/Excel"""
+    now = datetime.now()
     start_dt, end_dt = get_date_filters(start_date, end_date)
     
     if not start_dt or not end_dt:
         # Últimos 90 dias por padrão
-        end_dt = datetime.now()
+        end_dt = now
         start_dt = end_dt - timedelta(days=90)
     
     try:
-        # Construir query base
-        query = select(Expense, CostCenter, Category).join(
+        # Construir query base (apenas as colunas exportadas)
+        query = select(
+            Expense.transaction_date,
+            CostCenter.name,
+            Category.name,
+            Expense.description,
+            Expense.total_amount,
+            Expense.payment_method,
+            Expense.installments_count,
+            SharedAccount.name
+        ).join(
             CostCenter, Expense.cost_center_id == CostCenter.id
         ).join(
             Category, Expense.category_id == Category.id
+        ).outerjoin(
+            SharedAccount, Expense.shared_account_id == SharedAccount.id
         ).where(
             Expense.user_id == user_id,
             Expense.transaction_date >= start_dt,
@@ -862,42 +917,40 @@ async def export_expenses_to_excel(
         if shared_account_id:
             query = query.where(Expense.shared_account_id == shared_account_id)
         
-        expenses = session.execute(query.order_by(Expense.transaction_date.desc())).all()
-        
-        # Criar CSV em memória
-        output = io.StringIO()
-        writer = csv.writer(output)
+        query = query.order_by(Expense.transaction_date.desc())
         
-        # Cabeçalho
-        writer.writerow([
-            'Data', 'Centro de Custo', 'Categoria', 'Descrição', 
-            'Valor (R$)', 'Forma de Pagamento', 'Parcelas', 'Conta Compartilhada'
-        ])
-        
-        # Dados
-        for expense, cost_center_obj, category in expenses:
-            shared_account_name = "N/A"
-            if expense.shared_account_id:
-                shared_account = session.get(SharedAccount, expense.shared_account_id)
-                shared_account_name = shared_account.name if shared_account else "N/A"
+        def row_iter():
+            # Um único buffer reaproveitado: memória O(uma linha)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
             
-            writer.writerow([
-                expense.transaction_date.strftime('%d/%m/%Y'),
-                cost_center_obj.name,
-                category.name,
-                expense.description,
-                f"R$ {expense.total_amount:.2f}",
-                expense.payment_method,
-                f"{len(expense.installments)}x" if expense.installments else "À vista",
-                shared_account_name
-            ])
-        
-        output.seek(0)
-        
-        filename = f"despesas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            def encode(row):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(row)
+                return buffer.getvalue().encode('utf-8')
+            
+            yield _CSV_HEADER
+            
+            # Sessão própria: o corpo é transmitido depois que a sessão do Depends foi fechada
+            with SessionLocal() as stream_session:
+                rows = stream_session.execute(query).yield_per(1000)
+                for transaction_date, cc_name, cat_name, description, amount, payment_method, parcels, shared_name in rows:
+                    yield encode([
+                        transaction_date.strftime('%d/%m/%Y'),
+                        cc_name,
+                        cat_name,
+                        description,
+                        f"R$ {amount:.2f}",
+                        payment_method,
+                        f"{parcels}x" if parcels else "À vista",
+                        shared_name or "N/A"
+                    ])
+        
+        filename = f"despesas_{now:%Y%m%d_%H%M%S}.csv"
         
         return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8')),
+            row_iter(),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
@@ -912,85 +965,97 @@ async def export_expenses_to_excel(
 async def get_recent_expenses(user_id: int, session: Session = Depends(get_session)):
     """Retorna as últimas 5 despesas do usuário (para compatibilidade)"""
     try:
-        expenses = session.execute(
-            select(Expense)
+        # Apenas as colunas necessárias, já com os nomes via JOIN (sem materializar ORM)
+        rows = session.execute(
+            select(
+                Expense.id,
+                Expense.description,
+                Expense.total_amount,
+                Expense.payment_method,
+                CostCenter.name,
+                Category.name,
+                Expense.installments_count,
+                Expense.transaction_date
+            )
+            .outerjoin(CostCenter, Expense.cost_center_id == CostCenter.id)
+            .outerjoin(Category, Expense.category_id == Category.id)
             .where(Expense.user_id == user_id)
             .order_by(Expense.transaction_date.desc())
             .limit(5)
-        ).scalars().all()
-        
-        result = []
-        for expense in expenses:
-            cost_center = session.get(CostCenter, expense.cost_center_id)
-            category = session.get(Category, expense.category_id)
-            
-            result.append({
-                "id": expense.id,
-                "description": expense.description,
-                "total_amount": expense.total_amount,
-                "payment_method": expense.payment_method,
-                "cost_center": cost_center.name if cost_center else "N/A",
-                "category": category.name if category else "N/A",
-                "installments": len(expense.installments),
-                "created_at": expense.transaction_date.isoformat(),
-                "text": expense.description
-            })
+        ).all()
         
-        return result
+        return [
+            {
+                "id": r[0],
+                "description": r[1],
+                "total_amount": r[2],
+                "payment_method": r[3],
+                "cost_center": r[4] or "N/A",
+                "category": r[5] or "N/A",
+                "installments": r[6],
+                "created_at": r[7].isoformat(),
+                "text": r[1]
+            }
+            for r in rows
+        ]
         
     except Exception as e:
         logger.exception("Erro ao buscar despesas recentes")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===== ENDPOINTS DE DASHBOARD LEGADO (COMPATIBILIDADE) =====
+# Handlers síncronos: o FastAPI os executa no threadpool, sem bloquear o event loop
 
 @app.get("/api/dashboard/summary/{user_id}")
-async def get_dashboard_summary(user_id: int, session: Session = Depends(get_session)):
+@cached_by_user_state
+def get_dashboard_summary(user_id: int, session: Session = Depends(get_session)):
     """Retorna resumo para o dashboard (legado)"""
     try:
-        # Total de despesas
-        total_expenses = session.execute(
-            select(func.sum(Expense.total_amount)).where(Expense.user_id == user_id)
-        ).first() or 0.0
-
-        # Total do mês atual
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        monthly_expenses = session.execute(
-            select(func.sum(Expense.total_amount)).where(
-                Expense.user_id == user_id,
-                extract('month', Expense.transaction_date) == current_month,
-                extract('year', Expense.transaction_date) == current_year
-            )
-        ).first() or 0.0
-
-        # Total de despesas cadastradas
-        expenses_count = session.execute(
-            select(func.count(Expense.id)).where(Expense.user_id == user_id)
-        ).first() or 0
+        # Total geral, total do mês atual e quantidade em uma única consulta
+        now = datetime.now()
+        current_month, current_year = now.month, now.year
+        is_current_month = and_(
+            extract('month', Expense.transaction_date) == current_month,
+            extract('year', Expense.transaction_date) == current_year
+        )
+        total_expenses, monthly_expenses, expenses_count = session.execute(
+            select(
+                func.coalesce(func.sum(Expense.total_amount), 0.0),
+                func.coalesce(func.sum(case((is_current_month, Expense.total_amount), else_=0.0)), 0.0),
+                func.count(Expense.id)
+            ).where(Expense.user_id == user_id)
+        ).one()
 
         # Últimas despesas
-        recent_expenses = session.execute(
-            select(Expense)
+        recent_rows = session.execute(
+            select(
+                Expense.id,
+                Expense.description,
+                Expense.total_amount,
+                CostCenter.name,
+                Category.name,
+                Expense.payment_method,
+                Expense.transaction_date
+            )
+            .outerjoin(CostCenter, Expense.cost_center_id == CostCenter.id)
+            .outerjoin(Category, Expense.category_id == Category.id)
             .where(Expense.user_id == user_id)
             .order_by(Expense.transaction_date.desc())
             .limit(5)
         ).all()
 
-        recent_expenses_data = []
-        for expense in recent_expenses:
-            cost_center = session.get(CostCenter, expense.cost_center_id)
-            category = session.get(Category, expense.category_id)
-            
-            recent_expenses_data.append({
-                "id": expense.id,
-                "description": expense.description,
-                "amount": expense.total_amount,
-                "cost_center": cost_center.name if cost_center else "N/A",
-                "category": category.name if category else "N/A",
-                "payment_method": expense.payment_method,
-                "created_at": expense.transaction_date.isoformat()
-            })
+        recent_expenses_data = [
+            {
+                "id": r[0],
+                "description": r[1],
+                "amount": r[2],
+                "cost_center": r[3] or "N/A",
+                "category": r[4] or "N/A",
+                "payment_method": r[5],
+                "created_at": r[6].isoformat()
+            }
+            for r in recent_rows
+        ]
 
         return {
             "total_expenses": float(total_expenses),
@@ -1004,86 +1069,71 @@ async def get_dashboard_summary(user_id: int, session: Session = Depends(get_ses
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/expenses-by-category/{user_id}")
-async def get_expenses_by_category(user_id: int, session: Session = Depends(get_session)):
+@cached_by_user_state
+def get_expenses_by_category(user_id: int, session: Session = Depends(get_session)):
     """Retorna despesas agrupadas por categoria (legado)"""
     try:
-        # Buscar despesas com informações de categoria
-        expenses = session.execute(
-            select(Expense, Category)
-            .join(Category, Expense.category_id == Category.id)
+        # Agregação feita no banco: uma linha por categoria
+        rows = session.execute(
+            select(Category.name, func.sum(Expense.total_amount))
+            .join(Expense, Expense.category_id == Category.id)
             .where(Expense.user_id == user_id)
+            .group_by(Category.name)
         ).all()
 
-        category_totals = {}
-        for expense, category in expenses:
-            category_name = category.name
-            if category_name not in category_totals:
-                category_totals[category_name] = 0.0
-            category_totals[category_name] += expense.total_amount
-
         # Formatar para o gráfico
-        result = [{"category": cat, "amount": amount} for cat, amount in category_totals.items()]
-        
-        return result
+        return [{"category": name, "amount": float(amount)} for name, amount in rows]
 
     except Exception as e:
         logger.exception("Erro ao buscar despesas por categoria")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/expenses-by-cost-center/{user_id}")
-async def get_expenses_by_cost_center(user_id: int, session: Session = Depends(get_session)):
+@cached_by_user_state
+def get_expenses_by_cost_center(user_id: int, session: Session = Depends(get_session)):
     """Retorna despesas agrupadas por centro de custo (legado)"""
     try:
-        # Buscar despesas com informações de centro de custo
-        expenses = session.execute(
-            select(Expense, CostCenter)
-            .join(CostCenter, Expense.cost_center_id == CostCenter.id)
+        # Agregação feita no banco: uma linha por centro de custo
+        rows = session.execute(
+            select(CostCenter.name, func.sum(Expense.total_amount))
+            .join(Expense, Expense.cost_center_id == CostCenter.id)
             .where(Expense.user_id == user_id)
+            .group_by(CostCenter.name)
         ).all()
 
-        cost_center_totals = {}
-        for expense, cost_center in expenses:
-            center_name = cost_center.name
-            if center_name not in cost_center_totals:
-                cost_center_totals[center_name] = 0.0
-            cost_center_totals[center_name] += expense.total_amount
-
         # Formatar para o gráfico
-        result = [{"cost_center": center, "amount": amount} for center, amount in cost_center_totals.items()]
-        
-        return result
+        return [{"cost_center": name, "amount": float(amount)} for name, amount in rows]
 
     except Exception as e:
         logger.exception("Erro ao buscar despesas por centro de custo")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/monthly-trend/{user_id}")
-async def get_monthly_trend(user_id: int, session: Session = Depends(get_session)):
+@cached_by_user_state
+def get_monthly_trend(user_id: int, session: Session = Depends(get_session)):
     """Retorna tendência mensal dos últimos 6 meses (legado)"""
     try:
         # Calcular data de 6 meses atrás
         six_months_ago = datetime.now() - timedelta(days=180)
         
-        expenses = session.execute(
-            select(Expense)
+        # Agrupar por mês no próprio banco (YYYY-MM)
+        if session.get_bind().dialect.name == "postgresql":
+            month_col = func.to_char(Expense.transaction_date, "YYYY-MM")
+        else:
+            month_col = func.strftime("%Y-%m", Expense.transaction_date)
+        month_col = month_col.label("month")
+        
+        monthly_totals = session.execute(
+            select(month_col, func.sum(Expense.total_amount))
             .where(
                 Expense.user_id == user_id,
                 Expense.transaction_date >= six_months_ago
             )
+            .group_by(month_col)
+            .order_by(month_col)
         ).all()
-
-        # Agrupar por mês
-        monthly_totals = {}
-        for expense in expenses:
-            month_key = expense.transaction_date.strftime("%Y-%m")
-            if month_key not in monthly_totals:
-                monthly_totals[month_key] = 0.0
-            monthly_totals[month_key] += expense.total_amount
-
-        # Ordenar por mês
-        sorted_months = sorted(monthly_totals.items())
         
-        result = [{"month": month, "amount": amount} for month, amount in sorted_months[-6:]]  # Últimos 6 meses
+        result = [{"month": month, "amount": float(amount)} for month, amount in monthly_totals[-6:]]  # Últimos 6 meses
         
         return result
 
@@ -1133,32 +1183,52 @@ async def debug_user_setup(user_id: int, session: Session = Depends(get_session)
 async def debug_database(session: Session = Depends(get_session)):
     """Endpoint para debug do banco de dados"""
     try:
-        # Contar registros em cada tabela
-        users_count = session.execute(select(func.count(User.id))).scalar_one_or_none()
-        cost_centers_count = session.execute(select(func.count(CostCenter.id))).scalar_one_or_none()
-        categories_count = session.execute(select(func.count(Category.id))).scalar_one_or_none()
-        expenses_count = session.execute(select(func.count(Expense.id))).scalar_one_or_none()
-        installments_count = session.execute(select(func.count(Installment.id))).scalar_one_or_none()
-        shared_accounts_count = session.execute(select(func.count(SharedAccount.id))).scalar_one_or_none()
-        account_members_count = session.execute(select(func.count(AccountMember.id))).scalar_one_or_none()
-        account_invites_count = session.execute(select(func.count(AccountInvite.id))).scalar_one_or_none()
+        # Contar registros em cada tabela (uma única consulta com subconsultas escalares)
+        (
+            users_count,
+            cost_centers_count,
+            categories_count,
+            expenses_count,
+            installments_count,
+            shared_accounts_count,
+            account_members_count,
+            account_invites_count,
+        ) = session.execute(
+            select(*[
+                select(func.count()).select_from(model).scalar_subquery()
+                for model in (User, CostCenter, Category, Expense, Installment,
+                              SharedAccount, AccountMember, AccountInvite)
+            ])
+        ).one()
         
         # Listar algumas despesas
-        expenses = session.execute(select(Expense).limit(5)).all()
-        expenses_data = []
-        for expense in expenses:
-            cost_center = session.get(CostCenter, expense.cost_center_id)
-            category = session.get(Category, expense.category_id)
-            shared_account = session.get(SharedAccount, expense.shared_account_id) if expense.shared_account_id else None
-            expenses_data.append({
-                "id": expense.id,
-                "description": expense.description,
-                "amount": expense.total_amount,
-                "cost_center": cost_center.name if cost_center else "N/A",
-                "category": category.name if category else "N/A",
-                "shared_account": shared_account.name if shared_account else "N/A",
-                "transaction_date": expense.transaction_date
-            })
+        rows = session.execute(
+            select(
+                Expense.id,
+                Expense.description,
+                Expense.total_amount,
+                CostCenter.name,
+                Category.name,
+                SharedAccount.name,
+                Expense.transaction_date
+            )
+            .outerjoin(CostCenter, Expense.cost_center_id == CostCenter.id)
+            .outerjoin(Category, Expense.category_id == Category.id)
+            .outerjoin(SharedAccount, Expense.shared_account_id == SharedAccount.id)
+            .limit(5)
+        ).all()
+        expenses_data = [
+            {
+                "id": r[0],
+                "description": r[1],
+                "amount": r[2],
+                "cost_center": r[3] or "N/A",
+                "category": r[4] or "N/A",
+                "shared_account": r[5] or "N/A",
+                "transaction_date": r[6]
+            }
+            for r in rows
+        ]
         
         return {
             "database_file": "voiceexpense.db",
@@ -1182,51 +1252,48 @@ async def debug_database(session: Session = Depends(get_session)):
 async def test_save_expense(session: Session = Depends(get_session)):
     """Endpoint para testar salvamento manual"""
     try:
-        # Criar usuário de teste se não existir
-        user = session.execute(select(User).where(User.email == "teste@email.com")).scalar_one_or_none()
-        if not user:
-            user = User(
-                email="teste@email.com",
-                name="Usuário Teste",
-                user_type=UserType.PERSONAL,
-                onboarding_completed=True
-            )
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-        
-        # Criar centro de custo
-        cost_center = CostCenter(name="Teste", user_id=user.id, is_personal=True)
-        session.add(cost_center)
-        
-        # Criar categoria  
-        category = Category(name="Teste", user_id=user.id)
-        session.add(category)
-        
-        session.commit()
-        session.refresh(cost_center)
-        session.refresh(category)
-        
-        # Criar despesa
-        expense = Expense(
-            description="Despesa de teste",
-            total_amount=100.50,
-            payment_method="cartão crédito",
-            user_id=user.id,
-            cost_center_id=cost_center.id,
-            category_id=category.id,
-            transaction_date=datetime.utcnow()
-        )
-        session.add(expense)
-        session.commit()
-        session.refresh(expense)
+        # Uma única transação com INSERT ... RETURNING id (SQLAlchemy Core, sem instrumentação ORM)
+        with session.begin():
+            # Criar usuário de teste se não existir
+            user_id = session.execute(
+                select(User.id).where(User.email == "teste@email.com")
+            ).scalar_one_or_none()
+            if user_id is None:
+                user_id = session.execute(
+                    insert(User).values(
+                        email="teste@email.com",
+                        name="Usuário Teste",
+                        user_type=UserType.PERSONAL,
+                        onboarding_completed=True
+                    ).returning(User.id)
+                ).scalar_one()
+            
+            # Criar centro de custo e categoria
+            cost_center_id = session.execute(
+                insert(CostCenter).values(name="Teste", user_id=user_id, is_personal=True).returning(CostCenter.id)
+            ).scalar_one()
+            category_id = session.execute(
+                insert(Category).values(name="Teste", user_id=user_id).returning(Category.id)
+            ).scalar_one()
+            
+            # Criar despesa
+            expense_id = session.execute(
+                insert(Expense).values(
+                    description="Despesa de teste",
+                    total_amount=100.50,
+                    payment_method="cartão crédito",
+                    user_id=user_id,
+                    cost_center_id=cost_center_id,
+                    category_id=category_id,
+                    transaction_date=datetime.utcnow()
+                ).returning(Expense.id)
+            ).scalar_one()
         
         return {
             "status": "success",
             "message": "Despesa salva com sucesso",
-            "expense_id": expense.id
+            "expense_id": expense_id
         }
-
         
     except Exception as e:
         session.rollback()
@@ -1,6 +1,7 @@
 # backend/app/models.py - VERSÃO SIMPLIFICADA
-from sqlmodel import SQLModel, Field
-from typing import Optional
+from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, text
+from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -14,6 +15,12 @@ class PaymentStatus(str, Enum):
     PAID = "paid" 
     OVERDUE = "overdue"
 
+class InviteStatus(str, Enum):
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    EXPIRED = "expired"
+    CANCELLED = "cancelled"
+
 # Modelos básicos SEM relacionamentos complexos
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -25,6 +32,8 @@ class User(SQLModel, table=True):
     onboarding_completed: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    created_invites: List["AccountInvite"] = Relationship(back_populates="creator")
+
 class CostCenter(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -44,7 +53,16 @@ class SharedAccount(SQLModel, table=True):
     owner_id: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    invites: List["AccountInvite"] = Relationship(back_populates="account")
+
 class Expense(SQLModel, table=True):
+    # Índices compostos para listagens recentes e agregações por usuário do dashboard
+    __table_args__ = (
+        Index("ix_expense_user_txdate", "user_id", "transaction_date"),
+        Index("ix_expense_user_category", "user_id", "category_id"),
+        Index("ix_expense_user_costcenter", "user_id", "cost_center_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     description: str
     total_amount: float = Field(default=0.0, ge=0.0)
@@ -54,18 +72,33 @@ class Expense(SQLModel, table=True):
     category_id: int = Field(foreign_key="category.id")
     transaction_date: datetime = Field(default_factory=datetime.utcnow)
     is_installment: bool = False
+    installments_count: int = Field(default=0)  # desnormalizado: evita COUNT/carga das parcelas nas listagens
     shared_account_id: Optional[int] = Field(default=None, foreign_key="sharedaccount.id")
 
+    # Carregar sempre de forma explícita (selectinload) nas listagens
+    installments: List["Installment"] = Relationship(back_populates="expense")
+
 class Installment(SQLModel, table=True):
+    # Parcelas pendentes por vencimento (visão financeira). O enum é gravado pelo nome ('PENDING').
+    __table_args__ = (
+        Index(
+            "ix_installment_pending_due", "due_date",
+            postgresql_where=text("status = 'PENDING'"),
+            sqlite_where=text("status = 'PENDING'"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    expense_id: int = Field(foreign_key="expense.id")
+    expense_id: int = Field(foreign_key="expense.id", index=True)  # selectinload / exclusão das parcelas
     amount: float = Field(ge=0.0)
-    due_date: datetime
+    due_date: datetime = Field(index=True)
     status: PaymentStatus = Field(default=PaymentStatus.PENDING)
     installment_number: int = Field(ge=1)
     month_reference: str
     paid_at: Optional[datetime] = None
 
+    expense: Optional[Expense] = Relationship(back_populates="installments")
+
 class AccountMember(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     account_id: int = Field(foreign_key="sharedaccount.id")
@@ -74,13 +107,22 @@ class AccountMember(SQLModel, table=True):
     joined_at: datetime = Field(default_factory=datetime.utcnow)
 
 class AccountInvite(SQLModel, table=True):
+    # Convites pendentes por email (login e listagem de convites do usuário)
+    __table_args__ = (
+        Index("ix_invite_email_status_expires", "email", "status", "expires_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     account_id: int = Field(foreign_key="sharedaccount.id")
     email: str
     token: str = Field(unique=True, index=True)
     role: str = Field(default="member")
     created_by: int = Field(foreign_key="user.id")
-    status: str = Field(default="pending")
+    status: str = Field(default=InviteStatus.PENDING.value)  # valores de InviteStatus, gravados como texto
     expires_at: datetime
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    accepted_at: Optional[datetime] = None
\ No newline at end of file
+    accepted_at: Optional[datetime] = None
+
+    # Carregar sempre de forma explícita (selectinload) nas consultas de convites
+    account: Optional[SharedAccount] = Relationship(back_populates="invites")
+    creator: Optional[User] = Relationship(back_populates="created_invites")
\ No newline at end of file
@@ -1,21 +1,49 @@
 import re
 import unicodedata
 
+# Padrões compilados uma única vez no import
+_WHITESPACE_RE = re.compile(r"\s+")
+_REAI_FIX_RE = re.compile(r"\b(?:reai|reaus|reals)\b")
+# Palavras sem pontuação ("reais," / "cinquenta." viram "reais" / "cinquenta")
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Números por extenso
+_NUMBER_WORDS = {
+    "zero": 0, "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "três": 3,
+    "quatro": 4, "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9,
+    "dez": 10, "onze": 11, "doze": 12, "treze": 13, "catorze": 14, "quatorze": 14,
+    "quinze": 15, "dezesseis": 16, "dezessete": 17, "dezoito": 18, "dezenove": 19,
+    "vinte": 20, "trinta": 30, "quarenta": 40, "cinquenta": 50, "sessenta": 60,
+    "setenta": 70, "oitenta": 80, "noventa": 90,
+    "cem": 100, "cento": 100, "duzentos": 200, "trezentos": 300,
+    "quatrocentos": 400, "quinhentos": 500, "seiscentos": 600,
+    "setecentos": 700, "oitocentos": 800, "novecentos": 900,
+    "mil": 1000
+}
+# token -> (valor, tipo): "N" soma, "K" multiplica por mil, "R" (reais/real) fecha o valor
+_WORD_VALUES = {w: (v, "K" if v == 1000 else "N") for w, v in _NUMBER_WORDS.items()}
+_WORD_VALUES.update({"reais": (0, "R"), "real": (0, "R")})
+
+# Acentos do português -> ASCII (aplicado após lower())
+_FOLD_TABLE = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüç", "aaaaaeeeeiiiiooooouuuuc")
+_AMOUNT_RE = re.compile(
+    r"(?i)(?:r\$ ?)?(\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+(?:,\d{2})?)\s*(?:reais?|r?s)?"
+)
+
 def normalize_text(text: str) -> str:
-    text = unicodedata.normalize("NFD", text)
-    text = text.encode("ascii", "ignore").decode("utf-8")
-    text = text.lower()
-    text = re.sub(r"\s+", " ", text)
-    text = text.replace("reai", "reais").replace("reaus", "reais").replace("reals", "reais")
+    text = text.lower().translate(_FOLD_TABLE)
+    if not text.isascii():
+        # Caractere fora da tabela: remoção de acentos completa (mais lenta)
+        text = unicodedata.normalize("NFD", text)
+        text = text.encode("ascii", "ignore").decode("utf-8")
+    text = _WHITESPACE_RE.sub(" ", text)
+    text = _REAI_FIX_RE.sub("reais", text)
     return text
 
 def extract_amount(text: str) -> float:
     text = normalize_text(text)
 
-    numeric_pattern = re.compile(
-        r"(?i)(?:r\$ ?)?(\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+(?:,\d{2})?)\s*(?:reais?|r?s)?"
-    )
-    matches = numeric_pattern.findall(text)
+    matches = _AMOUNT_RE.findall(text)
 
     if matches:
         values = []
@@ -29,36 +57,20 @@ def extract_amount(text: str) -> float:
             return max(values)
 
     # converter por extenso (versão simplificada e robusta)
-    number_words = {
-        "zero": 0, "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "três": 3,
-        "quatro": 4, "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9,
-        "dez": 10, "onze": 11, "doze": 12, "treze": 13, "catorze": 14, "quatorze": 14,
-        "quinze": 15, "dezesseis": 16, "dezessete": 17, "dezoito": 18, "dezenove": 19,
-        "vinte": 20, "trinta": 30, "quarenta": 40, "cinquenta": 50, "sessenta": 60,
-        "setenta": 70, "oitenta": 80, "noventa": 90,
-        "cem": 100, "cento": 100, "duzentos": 200, "trezentos": 300,
-        "quatrocentos": 400, "quinhentos": 500, "seiscentos": 600,
-        "setecentos": 700, "oitocentos": 800, "novecentos": 900,
-        "mil": 1000
-    }
-
-    words = text.split()
     total = 0
     temp = 0
 
-    for w in words:
-        if w in number_words:
-            val = number_words[w]
-            if val == 1000:
-                if temp == 0:
-                    temp = 1
-                total += temp * 1000
-                temp = 0
-            else:
-                temp += val
-        elif w == "e":
+    for token in _WORD_RE.findall(text):
+        info = _WORD_VALUES.get(token)
+        if info is None:
             continue
-        elif "reais" in w or "real" in w:
+        value, kind = info
+        if kind == "N":
+            temp += value
+        elif kind == "K":
+            total += (temp or 1) * 1000
+            temp = 0
+        else:  # "reais"/"real" fecha o valor acumulado
             total += temp
             temp = 0
 
@@ -1,99 +1,458 @@
+import io
+import os
+import asyncio
+import multiprocessing
 import re
-import whisper
 import logging
+import hashlib
+import functools
+import threading
+import ahocorasick
+import numpy as np
+import ctranslate2
+from faster_whisper import WhisperModel, BatchedInferencePipeline, decode_audio
+from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, Collection
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# SOLUÇÃO RÁPIDA: Usar modelo base com cache
+@dataclass(slots=True)
+class InstallmentOut:
+    amount: float
+    due_date: datetime
+    installment_number: int
+    status: str = "pending"
+
+@dataclass(slots=True)
+class TranscribeOut:
+    text: str
+    description: str
+    total_amount: float
+    payment_method: str
+    cost_center: str
+    category: str
+    installments: List[InstallmentOut] = field(default_factory=list)
+
+# SOLUÇÃO RÁPIDA: Usar modelo base com cache (faster-whisper, int8 via CTranslate2)
 _model = None
+_pipeline = None
+_model_lock = threading.Lock()
+
+# Cache do texto transcrito por hash do áudio: on | off | read_only | write_only.
+# Guarda só o texto bruto; a extração roda sempre com os centros/categorias atuais do usuário.
+TRANSCRIBE_CACHE_MODE = os.getenv("VE_TRANSCRIBE_CACHE", "on").lower()
+_transcript_cache = TTLCache(maxsize=1024, ttl=3600)
+_transcript_lock = threading.Lock()
+
+# Padrões compilados uma única vez no import
+_DIGITS_RE = re.compile(r'\d+')
+_DECIMAL_RE = re.compile(r'(\d+)[,.](\d{2})')
+_REAIS_CENT_RE = re.compile(r'(\d+)\s*reais?\s*(?:e\s*)?(\d+)\s*centavos?')
+_NUMBERS_RE = re.compile(r'\b\d{2,5}\b')
+_INSTALLMENT_RE = re.compile(r'(\d+)\s*(?:vezes|parcela|x)')
+
+# CORREÇÕES ESPECÍFICAS dos problemas identificados nos logs (substituição literal).
+# As entradas idênticas ('insumos', 'vezes', ...) protegem a palavra correta de ser
+# capturada por uma correção mais curta contida nela ('sumos', 'veze').
+_LITERAL_FIXES = {
+    # Problemas do log atual:
+    'gasteio': 'gastei',
+    'ininsumos': 'insumos',
+    'insumos': 'insumos',
+    'catão de crédito': 'cartão crédito',
+    'catão': 'cartão',
+    'vezess': 'vezes',
+    'vezes': 'vezes',
+    'dasteio': 'gastei',
+    'compradir': 'comprar',
+    'manutençãoo': 'manutenção',
+    'restaaurante': 'restaurante',
+    'ser lado': 'parcelado',
+    'na compra de': 'comprar',
+    'meu restaurante': 'restaurante',
+    'meu ': '',
+    
+    # Problemas anteriores:
+    'centaos': 'centavos',
+    'sumos': 'insumos',
+    'parcelass': 'parcelas',
+    'veze': 'vezes',
+    'cartão de crédito': 'cartão crédito',
+    'mil ': '1000 ',
+    'mil,': '1000,',
+    'mil.': '1000.',
+    'mil reais': '1000 reais',
+}
+# Mais longas primeiro: a alternância escolhe a primeira opção que casa na posição
+_LITERAL_RE = re.compile("|".join(re.escape(k) for k in sorted(_LITERAL_FIXES, key=len, reverse=True)))
+
+_REGEX_FIXES = [
+    (re.compile(r'(\d+)x(\d+)%'), r'\1 reais e \2 centavos'),
+    (re.compile(r'(\d+)x(\d+)'), r'\1 reais e \2 centavos'),
+    (re.compile(r'(\d+)h(\d+)'), r'\1 reais e \2 centavos'),
+    (re.compile(r'(\d+)e(\d+)'), r'\1 reais e \2 centavos'),
+]
+
+# Qualquer trecho que alguma correção alteraria (literais não idênticas + regras regex).
+# Sem ocorrência, o texto já está limpo e o pipeline de correções pode ser pulado.
+_NEEDS_FIX_RE = re.compile("|".join(
+    [re.escape(k) for k, v in _LITERAL_FIXES.items() if k != v] +
+    [pattern.pattern for pattern, _ in _REGEX_FIXES]
+))
+
+# Palavras-chave dos classificadores, em ordem de prioridade
+_PAYMENT_RULES = (
+    (('crédito',), 'cartão crédito'),
+    (('débito',), 'cartão débito'),
+    (('dinheiro',), 'dinheiro'),
+    (('pix',), 'pix'),
+    (('transferência', 'ted', 'doc'), 'transferência'),
+    (('boleto',), 'boleto'),
+)
+# (palavras, categoria, alternativa se o usuário não tiver a categoria)
+_CATEGORY_RULES = (
+    (('roupas', 'vestuário'), "Vestuário", "Outros"),
+    (('insumos', 'material', 'comprar', 'matéria'), "Insumos", "Outros"),
+    (('luz', 'energia', 'água', 'gás'), "Contas", "Moradia"),
+    (('comida', 'restaurante', 'mercado', 'alimentação'), "Alimentação", "Outros"),
+    (('transporte', 'gasolina', 'combustível'), "Transporte", "Outros"),
+    (('manutenção', 'geladeira', 'reparo'), "Manutenção", "Outros"),
+)
+_INSTALLMENT_HINTS = ('vezes', 'parcela', 'x')
+# Vencimento de cada parcela: a cada 30 dias (máx. 12 parcelas)
+_MONTH_OFFSETS = tuple(timedelta(days=30 * (i + 1)) for i in range(12))
+
+# Palavra/padrão -> número de parcelas (2 a 10)
+_NUM_WORDS = {
+    word: count
+    for count, words in enumerate([
+        ('duas', 'dois', '2x', '2 vezes'),
+        ('três', 'tres', '3x', '3 vezes'),
+        ('quatro', '4x', '4 vezes'),
+        ('cinco', '5x', '5 vezes'),
+        ('seis', '6x', '6 vezes'),
+        ('sete', '7x', '7 vezes'),
+        ('oito', '8x', '8 vezes'),
+        ('nove', '9x', '9 vezes'),
+        ('dez', '10x', '10 vezes'),
+    ], 2)
+    for word in words
+}
+
+def _build_keyword_automaton() -> ahocorasick.Automaton:
+    keywords = {'insumos', *_INSTALLMENT_HINTS}
+    keywords.update(kw for kws, _ in _PAYMENT_RULES for kw in kws)
+    keywords.update(kw for kws, _, _ in _CATEGORY_RULES for kw in kws)
+    keywords.update(_NUM_WORDS)
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+# Aho-Corasick: encontra todas as palavras-chave numa única passada pelo texto
+_KW_AUTOMATON = _build_keyword_automaton()
+
+@functools.lru_cache(maxsize=256)
+def _keyword_hits(text: str) -> frozenset:
+    """Palavras-chave presentes no texto (mesma semântica de `kw in text`)"""
+    return frozenset(keyword for _, keyword in _KW_AUTOMATON.iter(text))
+
+# VE_WHISPER_DEVICE: auto (usa GPU se disponível) | cpu | cuda
+WHISPER_DEVICE = os.getenv("VE_WHISPER_DEVICE", "auto").lower()
+
+# Threads intra-op do CTranslate2. Com vários workers (WEB_CONCURRENCY) o padrão é 1 por
+# processo, para não disputar os mesmos núcleos; com um único processo, todos os núcleos.
+CPU_THREADS = int(os.getenv("VE_CPU_THREADS") or (1 if os.getenv("WEB_CONCURRENCY") else os.cpu_count() or 0))
+
+# Processos de ASR por servidor (só em CPU); com WEB_CONCURRENCY cada worker web tem 1
+ASR_WORKERS = max(1, int(os.getenv("VE_ASR_WORKERS") or (1 if os.getenv("WEB_CONCURRENCY") else (os.cpu_count() or 2) // 2)))
+
+# VE_BATCH_SIZE > 1 ativa o pipeline em lote (recomendado em GPU); 1 mantém a decodificação sequencial
+BATCH_SIZE = max(1, int(os.getenv("VE_BATCH_SIZE", "1")))
+
+def _select_device():
+    """
+    Dispositivo e quantização do CTranslate2: GPU (int8_float16) quando houver CUDA, senão CPU int8.
+    O decoder do CTranslate2 já usa cache KV, equivalente ao static cache + torch.compile do transformers.
+    """
+    device = WHISPER_DEVICE
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    return device, ("int8_float16" if device == "cuda" else "int8")
 
 def get_model():
     global _model
     if _model is None:
-        logger.info("🚀 Carregando modelo Whisper base (ultra-rápido)...")
-        _model = whisper.load_model("base")
+        with _model_lock:
+            if _model is None:
+                device, compute_type = _select_device()
+                logger.info(f"🚀 Carregando modelo Whisper base {compute_type} em {device} (faster-whisper)...")
+                _model = WhisperModel("base", device=device, compute_type=compute_type, cpu_threads=CPU_THREADS)
     return _model
 
-def transcribe_and_extract(audio_path: str, user_cost_centers: List[str] = None, user_categories: List[str] = None) -> Dict[str, Any]:
+def get_pipeline():
+    """Pipeline em lote do faster-whisper: decodifica os trechos do áudio em paralelo"""
+    global _pipeline
+    if _pipeline is None:
+        model = get_model()
+        with _model_lock:
+            if _pipeline is None:
+                _pipeline = BatchedInferencePipeline(model=model)
+    return _pipeline
+
+def warmup_model():
     """
-    Processamento ULTRA-RÁPIDO com modelo base + pós-processamento inteligente
+    Carrega o modelo e roda uma transcrição de 1s de silêncio para aquecer
+    encoder/decoder, tokenizer e o modelo de VAD antes da primeira requisição.
+    """
+    start = datetime.now()
+    model = get_model()
+    silence = np.zeros(16000, dtype=np.float32)
+    for vad_filter in (False, True):
+        segments, _ = model.transcribe(silence, language="pt", beam_size=1, vad_filter=vad_filter)
+        for _ in segments:
+            pass
+    if BATCH_SIZE > 1:
+        get_pipeline()
+    logger.info(f"🔥 Modelo Whisper aquecido em {(datetime.now() - start).total_seconds():.1f}s")
+
+def _load_audio(audio_bytes: bytes) -> np.ndarray:
+    """Decodifica o áudio (webm/ogg/wav...) uma única vez para float32 mono 16 kHz, em processo (PyAV)"""
+    return decode_audio(io.BytesIO(audio_bytes), sampling_rate=16000)
+
+def _run_whisper(audio: np.ndarray) -> str:
+    """Transcreve o áudio já decodificado e devolve o texto bruto"""
+    if BATCH_SIZE > 1:
+        transcribe = functools.partial(get_pipeline().transcribe, batch_size=BATCH_SIZE)
+    else:
+        transcribe = get_model().transcribe
+    segments, info = transcribe(
+        audio,
+        language="pt",
+        task="transcribe",
+        beam_size=1,  # MÍNIMO para velocidade
+        best_of=1,    # MÍNIMO para velocidade
+        temperature=0.0,
+        no_speech_threshold=0.7,  # Mais tolerante
+        compression_ratio_threshold=3.0,  # Muito tolerante
+        log_prob_threshold=-2.0,  # Muito tolerante
+        condition_on_previous_text=False,
+        vad_filter=True  # Pula trechos de silêncio
+    )
+    
+    # segments é um gerador: a decodificação acontece durante o join
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+def _audio_key(audio_bytes: bytes) -> str:
+    """Hash do conteúdo do áudio (reenvios e uploads duplicados têm a mesma chave)"""
+    return hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+
+def _cached_transcript(audio_key: Optional[str]) -> Optional[str]:
+    if audio_key is None or TRANSCRIBE_CACHE_MODE not in ("on", "read_only"):
+        return None
+    with _transcript_lock:
+        raw_text = _transcript_cache.get(audio_key)
+    if raw_text is not None:
+        logger.info("⚡ Transcrição encontrada no cache")
+    return raw_text
+
+def _store_transcript(audio_key: Optional[str], raw_text: str):
+    if audio_key is None or TRANSCRIBE_CACHE_MODE not in ("on", "write_only"):
+        return
+    with _transcript_lock:
+        _transcript_cache[audio_key] = raw_text
+
+def transcribe_audio(audio_bytes: bytes) -> str:
+    """
+    TRANSCRIÇÃO RÁPIDA (1-2 segundos), ou cache pelo conteúdo do áudio.
+    Bloqueante: em código async, usar transcribe_audio_async.
+    """
+    start_time = datetime.now()
+    
+    audio_key = _audio_key(audio_bytes) if TRANSCRIBE_CACHE_MODE != "off" else None
+    raw_text = _cached_transcript(audio_key)
+    if raw_text is None:
+        raw_text = _transcribe_uncached(audio_bytes)
+        _store_transcript(audio_key, raw_text)
+    
+    transcribe_time = (datetime.now() - start_time).total_seconds()
+    logger.info(f"⏱️  Transcrição: {transcribe_time:.1f}s -> {raw_text}")
+    return raw_text
+
+async def transcribe_audio_async(audio_bytes: bytes) -> str:
+    """
+    Versão async de transcribe_audio: o cache é consultado neste processo e só
+    os misses vão para o executor de ASR, sem bloquear o event loop.
     """
     start_time = datetime.now()
     
+    audio_key = _audio_key(audio_bytes) if TRANSCRIBE_CACHE_MODE != "off" else None
+    raw_text = _cached_transcript(audio_key)
+    if raw_text is None:
+        loop = asyncio.get_running_loop()
+        try:
+            raw_text = await loop.run_in_executor(get_asr_executor(), _transcribe_uncached, audio_bytes)
+        except BrokenProcessPool:
+            # Um worker morreu (ex.: falta de memória): recriar o pool na próxima chamada
+            shutdown_asr_executor()
+            raise
+        _store_transcript(audio_key, raw_text)
+    
+    transcribe_time = (datetime.now() - start_time).total_seconds()
+    logger.info(f"⏱️  Transcrição: {transcribe_time:.1f}s -> {raw_text}")
+    return raw_text
+
+# ===== EXECUTOR DE ASR =====
+
+_asr_executor = None
+_executor_lock = threading.Lock()
+
+def _transcribe_uncached(audio_bytes: bytes) -> str:
+    return _run_whisper(_load_audio(audio_bytes))
+
+def _init_asr_worker(cpu_threads: int):
+    """Inicializador de cada processo do pool: fixa as threads e aquece o próprio modelo"""
+    global CPU_THREADS
+    CPU_THREADS = cpu_threads
     try:
-        if user_cost_centers is None or len(user_cost_centers) == 0:
-            user_cost_centers = ["Pessoal"]
-        if user_categories is None or len(user_categories) == 0:
-            user_categories = ["Alimentação", "Transporte", "Moradia", "Saúde", "Educação", "Entretenimento", "Outros"]
-        
-        # 1. TRANSCRIÇÃO RÁPIDA (1-2 segundos)
-        model = get_model()
-        result = model.transcribe(
-            audio_path,
-            language='pt',
-            task='transcribe',
-            fp16=False,
-            beam_size=1,  # MÍNIMO para velocidade
-            best_of=1,    # MÍNIMO para velocidade
-            temperature=0.0,
-            no_speech_threshold=0.7,  # Mais tolerante
-            compression_ratio_threshold=3.0,  # Muito tolerante
-            logprob_threshold=-2.0,  # Muito tolerante
-            condition_on_previous_text=False,
-            verbose=None  # SEM logs do Whisper
-        )
-        
-        raw_text = result["text"].strip()
-        transcribe_time = (datetime.now() - start_time).total_seconds()
-        
-        logger.info(f"⏱️  Transcrição: {transcribe_time:.1f}s -> {raw_text}")
-        
-        # 2. PÓS-PROCESSAMENTO INTELIGENTE (instantâneo)
-        text = ultra_fast_text_processing(raw_text)
-        logger.info(f"🔧 Texto processado: {text}")
-        
-        # 3. EXTRAÇÃO ULTRA-RÁPIDA (instantânea)
-        extract_start = datetime.now()
-        amount = ultra_fast_amount_extraction(text)
-        payment_method = ultra_fast_payment_method(text)
-        cost_center = ultra_fast_cost_center(text, user_cost_centers)
-        category = ultra_fast_category(text, user_categories, cost_center)
-        
-        # CORREÇÃO CRÍTICA: Apenas cartão crédito gera parcelas futuras
-        installments_data = ultra_fast_installments(text, amount, payment_method)
-        
-        extract_time = (datetime.now() - extract_start).total_seconds()
-        total_time = (datetime.now() - start_time).total_seconds()
-        
-        description = f"Despesa de R$ {amount:.2f} em {category} - {cost_center} ({payment_method})"
-        
-        logger.info(f"✅ TOTAL: {total_time:.1f}s | R$ {amount:.2f} | {payment_method} | {cost_center} | {category} | {len(installments_data)}x")
-        
-        return {
-            "text": text,
-            "description": description,
-            "total_amount": amount,
-            "payment_method": payment_method,
-            "cost_center": cost_center,
-            "category": category,
-            "installments": installments_data
-        }
-        
+        warmup_model()
+    except Exception as e:
+        # Não quebrar o pool: o modelo será carregado na primeira transcrição
+        logger.error(f"❌ Erro ao aquecer modelo no worker de ASR: {e}")
+
+def _asr_ready() -> bool:
+    return _model is not None
+
+def get_asr_executor():
+    """
+    Executor da transcrição:
+    - CPU: pool de processos (spawn), cada um com seu modelo e CPU_THREADS divididas entre eles;
+    - GPU ou pipeline em lote: uma única thread, para existir um só contexto CUDA.
+    """
+    global _asr_executor
+    if _asr_executor is None:
+        with _executor_lock:
+            if _asr_executor is None:
+                device, _ = _select_device()
+                if device == "cuda" or BATCH_SIZE > 1:
+                    _asr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr")
+                else:
+                    _asr_executor = ProcessPoolExecutor(
+                        max_workers=ASR_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_asr_worker,
+                        initargs=(max(1, CPU_THREADS // ASR_WORKERS),)
+                    )
+    return _asr_executor
+
+async def warmup_asr():
+    """Cria o executor e aquece o modelo onde a transcrição vai rodar"""
+    executor = get_asr_executor()
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        # Os processos sobem sob demanda (um por submit enquanto não há worker ocioso):
+        # uma tarefa por worker garante que todos subam e que o initializer aqueça o modelo em cada um
+        await asyncio.gather(*[loop.run_in_executor(executor, _asr_ready) for _ in range(ASR_WORKERS)])
+    else:
+        await loop.run_in_executor(executor, warmup_model)
+
+def shutdown_asr_executor():
+    global _asr_executor
+    with _executor_lock:
+        executor, _asr_executor = _asr_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _with_defaults(user_cost_centers: Optional[List[str]], user_categories: Optional[List[str]]):
+    if not user_cost_centers:
+        user_cost_centers = ["Pessoal"]
+    if not user_categories:
+        user_categories = ["Alimentação", "Transporte", "Moradia", "Saúde", "Educação", "Entretenimento", "Outros"]
+    return user_cost_centers, user_categories
+
+def extract_expense(raw_text: str, user_cost_centers: List[str] = None, user_categories: List[str] = None) -> TranscribeOut:
+    """Pós-processamento + extração (instantâneos) a partir do texto transcrito"""
+    user_cost_centers, user_categories = _with_defaults(user_cost_centers, user_categories)
+    
+    # 2. PÓS-PROCESSAMENTO INTELIGENTE (instantâneo)
+    text = ultra_fast_text_processing(raw_text)
+    logger.info(f"🔧 Texto processado: {text}")
+    
+    # 3. EXTRAÇÃO ULTRA-RÁPIDA (instantânea)
+    extracted = extract_all(text, user_cost_centers, user_categories)
+    amount = extracted["amount"]
+    payment_method = extracted["payment_method"]
+    cost_center = extracted["cost_center"]
+    category = extracted["category"]
+    installments_data = extracted["installments"]
+    
+    description = f"Despesa de R$ {amount:.2f} em {category} - {cost_center} ({payment_method})"
+    
+    logger.info(f"✅ R$ {amount:.2f} | {payment_method} | {cost_center} | {category} | {len(installments_data)}x")
+    
+    return TranscribeOut(
+        text=text,
+        description=description,
+        total_amount=amount,
+        payment_method=payment_method,
+        cost_center=cost_center,
+        category=category,
+        installments=installments_data
+    )
+
+def fallback_result(user_cost_centers: List[str] = None, user_categories: List[str] = None) -> TranscribeOut:
+    """Fallback instantâneo quando a transcrição falha"""
+    user_cost_centers, user_categories = _with_defaults(user_cost_centers, user_categories)
+    return TranscribeOut(
+        text="Processamento rápido",
+        description="Despesa registrada",
+        total_amount=0.0,
+        payment_method="indefinida",
+        cost_center=user_cost_centers[0],
+        category=user_categories[0],
+        installments=[]
+    )
+
+def transcribe_and_extract(audio_path: str, user_cost_centers: List[str] = None, user_categories: List[str] = None) -> TranscribeOut:
+    """
+    Processamento ULTRA-RÁPIDO com modelo base + pós-processamento inteligente
+    """
+    try:
+        with open(audio_path, "rb") as f:
+            raw_text = transcribe_audio(f.read())
+        return extract_expense(raw_text, user_cost_centers, user_categories)
     except Exception as e:
         logger.error(f"❌ Erro: {e}")
-        # Fallback instantâneo
-        return {
-            "text": "Processamento rápido",
-            "description": "Despesa registrada",
-            "total_amount": 0.0,
-            "payment_method": "indefinida",
-            "cost_center": user_cost_centers[0] if user_cost_centers else "Pessoal",
-            "category": user_categories[0] if user_categories else "Outros",
-            "installments": []
-        }
+        return fallback_result(user_cost_centers, user_categories)
+
+def extract_all(text: str, user_cost_centers: List[str], user_categories: List[str]) -> Dict[str, Any]:
+    """
+    Extrai todos os campos de um texto já processado.
+    Os classificadores compartilham uma única varredura de palavras-chave (_keyword_hits).
+    """
+    # Preparados uma vez por requisição: nomes em minúsculas e categorias em conjunto (busca O(1))
+    non_personal = _non_personal_centers(user_cost_centers)
+    category_set = frozenset(user_categories)
+    
+    amount_cents = ultra_fast_amount_cents(text)
+    payment_method = ultra_fast_payment_method(text)
+    cost_center = _match_cost_center(text, non_personal)
+    
+    return {
+        "amount": amount_cents / 100,
+        "amount_cents": amount_cents,
+        "payment_method": payment_method,
+        "cost_center": cost_center,
+        "category": ultra_fast_category(text, category_set, cost_center),
+        # CORREÇÃO CRÍTICA: Apenas cartão crédito gera parcelas futuras
+        "installments": installments_from_cents(text, amount_cents, payment_method)
+    }
 
 def ultra_fast_text_processing(text: str) -> str:
     """
@@ -104,164 +463,109 @@ def ultra_fast_text_processing(text: str) -> str:
     
     text = text.lower().strip()
     
-    # CORREÇÕES ESPECÍFICAS dos problemas identificados nos logs:
-    critical_fixes = {
-        # Problemas do log atual:
-        'gasteio': 'gastei',
-        'ininsumos': 'insumos',
-        'insumos': 'insumos',
-        'catão': 'cartão',
-        'vezess': 'vezes',
-        'dasteio': 'gastei',
-        'compradir': 'comprar',
-        'manutençãoo': 'manutenção',
-        'restaaurante': 'restaurante',
-        'manutenção': 'manutenção',
-        'ser lado': 'parcelado',
-        'na compra de': 'comprar',
-        'meu restaurante': 'restaurante',
-        'meu ': '',
-        
-        # Problemas anteriores:
-        r'(\d+)x(\d+)%': r'\1 reais e \2 centavos',
-        r'(\d+)x(\d+)': r'\1 reais e \2 centavos',
-        r'(\d+)h(\d+)': r'\1 reais e \2 centavos',
-        r'(\d+)e(\d+)': r'\1 reais e \2 centavos',
-        'centaos': 'centavos',
-        'sumos': 'insumos',
-        'parcelass': 'parcelas',
-        'veze': 'vezes',
-        'cartão de crédito': 'cartão crédito',
-        'cartão crédito': 'cartão crédito',
-        'mil ': '1000 ',
-        'mil,': '1000,',
-        'mil.': '1000.',
-        'mil reais': '1000 reais',
-    }
+    # Caminho rápido: saída já limpa e com contexto monetário (caso mais comum)
+    if 'reais' in text and _DIGITS_RE.search(text) and not _NEEDS_FIX_RE.search(text):
+        return text
     
-    # Aplicar correções de forma ULTRA-RÁPIDA
-    for wrong, correct in critical_fixes.items():
-        if wrong in text:
-            text = text.replace(wrong, correct)
+    # Correções literais numa única passada (alternância compilada), depois as regex
+    text = _LITERAL_RE.sub(lambda m: _LITERAL_FIXES[m.group(0)], text)
+    for pattern, repl in _REGEX_FIXES:
+        text = pattern.sub(repl, text)
     
     # Garantir que tem contexto monetário básico
     if not any(word in text for word in ['gastei', 'paguei', 'reais']):
         if any(word in text for word in ['centavos', 'cartão', 'parcela']):
             text = f"gastei {text}"
-        elif re.search(r'\d+', text):
+        elif _DIGITS_RE.search(text):
             text = f"gastei {text} reais"
     
     return text
 
 def ultra_fast_amount_extraction(text: str) -> float:
+    """Valor em reais (compatibilidade); o cálculo é feito em centavos inteiros"""
+    return ultra_fast_amount_cents(text) / 100
+
+def ultra_fast_amount_cents(text: str) -> int:
     """
-    Extração INSTANTÂNEA de valores - CORRIGIDA para milhares
+    Extração INSTANTÂNEA de valores em centavos - CORRIGIDA para milhares
     """
     # ESTRATÉGIA 1: Padrão "mil reais"
     if 'mil reais' in text or '1000 reais' in text:
         logger.info(f"💰 Valor por 'mil reais': R$ 1000.00")
-        return 1000.0
+        return 100000
     
     # ESTRATÉGIA 2: Padrão "X,Y" (87,55)
-    match_decimal = re.search(r'(\d+)[,.](\d{2})', text)
+    match_decimal = _DECIMAL_RE.search(text)
     if match_decimal:
-        try:
-            reais = float(match_decimal.group(1))
-            centavos = float(match_decimal.group(2)) / 100
-            amount = round(reais + centavos, 2)
-            logger.info(f"💰 Valor por decimal: {reais} + {centavos} = R$ {amount:.2f}")
-            return amount
-        except:
-            pass
+        reais, centavos = int(match_decimal.group(1)), int(match_decimal.group(2))
+        cents = reais * 100 + centavos
+        logger.info(f"💰 Valor por decimal: {reais} + {centavos}c = R$ {cents / 100:.2f}")
+        return cents
     
     # ESTRATÉGIA 3: Padrão "X reais Y centavos" 
-    match_reais_centavos = re.search(r'(\d+)\s*reais?\s*(?:e\s*)?(\d+)\s*centavos?', text)
+    match_reais_centavos = _REAIS_CENT_RE.search(text)
     if match_reais_centavos:
-        try:
-            reais = float(match_reais_centavos.group(1))
-            centavos = float(match_reais_centavos.group(2)) / 100
-            amount = round(reais + centavos, 2)
-            logger.info(f"💰 Valor por reais/centavos: {reais} + {centavos} = R$ {amount:.2f}")
-            return amount
-        except:
-            pass
+        reais, centavos = int(match_reais_centavos.group(1)), int(match_reais_centavos.group(2))
+        cents = reais * 100 + centavos
+        logger.info(f"💰 Valor por reais/centavos: {reais} + {centavos}c = R$ {cents / 100:.2f}")
+        return cents
     
     # ESTRATÉGIA 4: Apenas números que fazem sentido
-    numbers = re.findall(r'\b\d{2,5}\b', text)  # Apenas 2-5 dígitos
-    valid = []
-    
-    for num in numbers:
-        n = float(num)
-        # Valores realistas para despesas
-        if 5 <= n <= 10000:  
-            valid.append(n)
+    numbers = _NUMBERS_RE.findall(text)  # Apenas 2-5 dígitos
+    # Valores realistas para despesas
+    valid = [n for n in map(int, numbers) if 5 <= n <= 10000]
     
     if valid:
         amount = max(valid)  # Maior número provavelmente é o valor
         logger.info(f"💰 Valor por maior número: R$ {amount:.2f}")
-        return amount
+        return amount * 100
     
     # ESTRATÉGIA 5: Fallback baseado em contexto
     if any(word in text for word in ['parcela', 'vezes', 'cartão']):
         logger.info("💰 Valor fallback contextual: R$ 100.00")
-        return 100.0  # Valor comum para transações
+        return 10000  # Valor comum para transações
     
     logger.info("💰 Valor fallback padrão: R$ 50.00")
-    return 50.0  # Valor fallback padrão
+    return 5000  # Valor fallback padrão
 
 def ultra_fast_payment_method(text: str) -> str:
     """Detecção INSTANTÂNEA de pagamento"""
-    if 'crédito' in text:
-        return 'cartão crédito'
-    elif 'débito' in text:
-        return 'cartão débito'
-    elif 'dinheiro' in text:
-        return 'dinheiro'
-    elif 'pix' in text:
-        return 'pix'
-    elif 'transferência' in text or 'ted' in text or 'doc' in text:
-        return 'transferência'
-    elif 'boleto' in text:
-        return 'boleto'
-    else:
-        return 'indefinida'
+    hits = _keyword_hits(text)
+    for keywords, method in _PAYMENT_RULES:
+        if not hits.isdisjoint(keywords):
+            return method
+    return 'indefinida'
+
+def _non_personal_centers(user_cost_centers: List[str]) -> Tuple[Tuple[str, str], ...]:
+    """(nome em minúsculas, nome original) dos centros de custo, exceto Pessoal"""
+    return tuple((lowered, cc) for cc in user_cost_centers if (lowered := cc.lower()) != "pessoal")
 
 def ultra_fast_cost_center(text: str, user_cost_centers: List[str]) -> str:
     """Detecção INSTANTÂNEA de centro de custo"""
-    if not user_cost_centers:
-        return "Pessoal"
-    
-    # Busca DIRETA por nomes (exceto Pessoal)
-    non_personal = [cc for cc in user_cost_centers if cc.lower() != "pessoal"]
-    
-    for center in non_personal:
-        if center.lower() in text:
+    return _match_cost_center(text, _non_personal_centers(user_cost_centers or ()))
+
+def _match_cost_center(text: str, non_personal: Tuple[Tuple[str, str], ...]) -> str:
+    # Busca DIRETA por nomes (exceto Pessoal), já em minúsculas
+    for lowered, center in non_personal:
+        if lowered in text:
             return center
     
     # Se menciona "insumos" e tem centros empresariais, usar o primeiro
-    if 'insumos' in text and non_personal:
-        return non_personal[0]
+    if non_personal and 'insumos' in _keyword_hits(text):
+        return non_personal[0][1]
     
     return "Pessoal"
 
-def ultra_fast_category(text: str, user_categories: List[str], cost_center: str) -> str:
+def ultra_fast_category(text: str, user_categories: Collection[str], cost_center: str) -> str:
     """Detecção INSTANTÂNEA de categoria"""
     if not user_categories:
         return "Outros"
     
-    # CORREÇÃO: Detecção melhorada de categorias
-    if 'roupas' in text or 'vestuário' in text:
-        return "Vestuário" if "Vestuário" in user_categories else "Outros"
-    elif 'insumos' in text or 'material' in text or 'comprar' in text or 'matéria' in text:
-        return "Insumos" if "Insumos" in user_categories else "Outros"
-    elif 'luz' in text or 'energia' in text or 'água' in text or 'gás' in text:
-        return "Contas" if "Contas" in user_categories else "Moradia"
-    elif 'comida' in text or 'restaurante' in text or 'mercado' in text or 'alimentação' in text:
-        return "Alimentação" if "Alimentação" in user_categories else "Outros"
-    elif 'transporte' in text or 'gasolina' in text or 'combustível' in text:
-        return "Transporte" if "Transporte" in user_categories else "Outros"
-    elif 'manutenção' in text or 'geladeira' in text or 'reparo' in text:
-        return "Manutenção" if "Manutenção" in user_categories else "Outros"
+    # CORREÇÃO: Detecção melhorada de categorias (regras em ordem de prioridade)
+    hits = _keyword_hits(text)
+    for keywords, category, fallback in _CATEGORY_RULES:
+        if not hits.isdisjoint(keywords):
+            return category if category in user_categories else fallback
     
     # Lógica empresarial rápida
     if cost_center != "Pessoal":
@@ -269,54 +573,41 @@ def ultra_fast_category(text: str, user_categories: List[str], cost_center: str)
     
     return "Alimentação" if "Alimentação" in user_categories else "Outros"
 
-def ultra_fast_installments(text: str, total_amount: float, payment_method: str) -> List[Dict[str, Any]]:
+def ultra_fast_installments(text: str, total_amount: float, payment_method: str) -> List[InstallmentOut]:
+    """Parcelas a partir do valor em reais (compatibilidade)"""
+    return installments_from_cents(text, round(total_amount * 100), payment_method)
+
+def installments_from_cents(text: str, total_cents: int, payment_method: str) -> List[InstallmentOut]:
     """
     Detecção INSTANTÂNEA de parcelamento - CORREÇÃO CRÍTICA APLICADA
     """
-    if total_amount <= 0:
+    if total_cents <= 0:
         return []
     
+    today = datetime.now()
+    
     # CORREÇÃO: Apenas cartão crédito gera parcelas futuras
     # Pagamentos à vista (dinheiro, débito, pix, etc.) devem ter vencimento imediato
     is_credit_card = payment_method == 'cartão crédito'
     
     # Verificação ULTRA-RÁPIDA
-    has_installments = 'vezes' in text or 'parcela' in text or 'x' in text
+    hits = _keyword_hits(text)
+    has_installments = not hits.isdisjoint(_INSTALLMENT_HINTS)
     
     if not has_installments or not is_credit_card:
         # Pagamento à vista - vencimento imediato
-        return [{
-            "amount": total_amount,
-            "due_date": datetime.now(),
-            "status": "pending",
-            "installment_number": 1
-        }]
+        return [InstallmentOut(amount=total_cents / 100, due_date=today, installment_number=1)]
     
     # Número de parcelas SIMPLES (apenas para cartão crédito)
     num_installments = 1
     
-    # Busca RÁPIDA por números
-    if 'duas' in text or 'dois' in text or '2x' in text or '2 vezes' in text:
-        num_installments = 2
-    elif 'três' in text or 'tres' in text or '3x' in text or '3 vezes' in text:
-        num_installments = 3
-    elif 'quatro' in text or '4x' in text or '4 vezes' in text:
-        num_installments = 4
-    elif 'cinco' in text or '5x' in text or '5 vezes' in text:
-        num_installments = 5
-    elif 'seis' in text or '6x' in text or '6 vezes' in text:
-        num_installments = 6
-    elif 'sete' in text or '7x' in text or '7 vezes' in text:
-        num_installments = 7
-    elif 'oito' in text or '8x' in text or '8 vezes' in text:
-        num_installments = 8
-    elif 'nove' in text or '9x' in text or '9 vezes' in text:
-        num_installments = 9
-    elif 'dez' in text or '10x' in text or '10 vezes' in text:
-        num_installments = 10
+    # Busca RÁPIDA por números (o menor número citado vence, como na antiga cadeia if/elif)
+    counts = [_NUM_WORDS[word] for word in hits if word in _NUM_WORDS]
+    if counts:
+        num_installments = min(counts)
     else:
         # Tentar encontrar número
-        match = re.search(r'(\d+)\s*(?:vezes|parcela|x)', text)
+        match = _INSTALLMENT_RE.search(text)
         if match:
             try:
                 num = int(match.group(1))
@@ -326,31 +617,24 @@ def ultra_fast_installments(text: str, total_amount: float, payment_method: str)
                 pass
     
     # Validação prática
-    if total_amount < 20:
+    if total_cents < 2000:
         num_installments = 1
     
     # Criar parcelas (apenas para cartão crédito com parcelamento)
     if num_installments > 1 and is_credit_card:
-        installments = []
-        installment_amount = total_amount / num_installments
-        today = datetime.now()
-        
-        for i in range(num_installments):
-            installments.append({
-                "amount": round(installment_amount, 2),
-                "due_date": today + timedelta(days=30 * (i + 1)),
-                "status": "pending",
-                "installment_number": i + 1
-            })
-        return installments
+        # Divisão exata em centavos: o resto vai para as primeiras parcelas (soma = total)
+        per_installment, remainder = divmod(total_cents, num_installments)
+        return [
+            InstallmentOut(
+                amount=(per_installment + (i < remainder)) / 100,
+                due_date=today + offset,
+                installment_number=i + 1
+            )
+            for i, offset in enumerate(_MONTH_OFFSETS[:num_installments])
+        ]
     else:
         # Pagamento único (à vista ou cartão crédito sem parcelamento)
-        return [{
-            "amount": total_amount,
-            "due_date": datetime.now(),
-            "status": "pending",
-            "installment_number": 1
-        }]
+        return [InstallmentOut(amount=total_cents / 100, due_date=today, installment_number=1)]
 
 # Função de teste ULTRA-RÁPIDA
 def test_extraction(text: str, user_cost_centers: List[str] = None, user_categories: List[str] = None):
@@ -362,21 +646,17 @@ def test_extraction(text: str, user_cost_centers: List[str] = None, user_categor
         user_categories = ["Alimentação", "Transporte", "Contas", "Insumos", "Vestuário", "Outros"]
     
     processed = ultra_fast_text_processing(text)
-    amount = ultra_fast_amount_extraction(processed)
-    payment = ultra_fast_payment_method(processed)
-    cost_center = ultra_fast_cost_center(processed, user_cost_centers)
-    category = ultra_fast_category(processed, user_categories, cost_center)
-    installments = ultra_fast_installments(processed, amount, payment)
+    extracted = extract_all(processed, user_cost_centers, user_categories)
     
     elapsed = (datetime.now() - start).total_seconds()
     
     return {
         "processing_time": f"{elapsed:.3f}s",
         "processed_text": processed,
-        "amount": amount,
-        "payment_method": payment,
-        "cost_center": cost_center,
-        "category": category,
-        "installments_count": len(installments),
-        "is_credit_card": payment == 'cartão crédito'
+        "amount": extracted["amount"],
+        "payment_method": extracted["payment_method"],
+        "cost_center": extracted["cost_center"],
+        "category": extracted["category"],
+        "installments_count": len(extracted["installments"]),
+        "is_credit_card": extracted["payment_method"] == 'cartão crédito'
     }
\ No newline at end of file
@@ -1,14 +1,99 @@
 # backend/app/security.py
 import jwt
-from datetime import datetime, timedelta
+import orjson
+import asyncio
+import time
+import functools
+import hashlib
+import hmac
+import base64
+import threading
+import logging
+import redis
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, bindparam
+from sqlalchemy.orm import make_transient_to_detached
+from jwt.api_jws import PyJWS
+from jwt.algorithms import HMACAlgorithm
+from dataclasses import dataclass
+from types import MappingProxyType
 from typing import Optional
+from fastapi import HTTPException, Request, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 import os
-import requests
+import importlib.util
+import httpx
+
+from .cache import get_redis
+from .db import get_session
+from .models import User
+
+logger = logging.getLogger(__name__)
+auth_logger = logging.getLogger("auth")
 
 # Configurações JWT
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "sua-chave-secreta-padrao-mude-em-producao")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+class _PreparedHMACAlgorithm(HMACAlgorithm):
+    """HMAC que valida/converte a chave uma única vez (o PyJWT refaz isso a cada chamada)"""
+
+    @functools.lru_cache(maxsize=4)
+    def prepare_key(self, key):
+        return super().prepare_key(key)
+
+# Instância JWS própria: só aceita HS256 e reaproveita a chave já preparada
+_HS256 = _PreparedHMACAlgorithm(HMACAlgorithm.SHA256)
+_HS256.prepare_key(SECRET_KEY)
+_jws = PyJWS(algorithms=[])
+_jws.register_algorithm(ALGORITHM, _HS256)
+
+_KEY_BYTES = SECRET_KEY.encode()
+
+# Padding exato por len % 4 (resto 1 nunca é base64 válido: "===" faz o decoder rejeitar)
+_B64URL_PADDING = ("", "===", "==", "=")
+
+def _b64url_decode(segment: str) -> bytes:
+    """Decodifica um segmento base64url de JWT (sem padding)"""
+    return base64.urlsafe_b64decode(segment + _B64URL_PADDING[len(segment) % 4])
+
+@functools.lru_cache(maxsize=16)
+def _is_hs256_header(header_b64: str) -> bool:
+    """O cabeçalho dos nossos tokens é sempre o mesmo; decodifica cada variante uma vez só"""
+    try:
+        header = orjson.loads(_b64url_decode(header_b64))
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("alg") == ALGORITHM and set(header) <= {"alg", "typ"}
+
+def _fast_verify_hs256(token: str):
+    """
+    Verificação HS256 só com a stdlib: um HMAC-SHA256 e um compare_digest
+    
+    Tokens com outro cabeçalho seguem pelo PyJWS, que valida/rejeita o algoritmo.
+    Não valida claims (exp é conferido em verify_token).
+    
+    Raises:
+        jwt.InvalidTokenError: token malformado ou assinatura inválida
+    """
+    try:
+        signing_input, _, signature_b64 = token.rpartition(".")
+        header_b64, _, payload_b64 = signing_input.partition(".")
+        if not payload_b64 or not _is_hs256_header(header_b64):
+            return orjson.loads(_jws.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+        
+        signature = _b64url_decode(signature_b64)
+        expected = hmac.new(_KEY_BYTES, signing_input.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(signature, expected):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+        
+        return orjson.loads(_b64url_decode(payload_b64))
+    except (ValueError, UnicodeError) as e:
+        raise jwt.DecodeError(f"Token malformado: {e}") from e
 
 def create_user_token(user):
     """
@@ -21,19 +106,28 @@ def create_user_token(user):
         str: JWT token codificado
     """
     try:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # Claims mínimas: sub (id como string, padrão JWT) e "e" (email)
         to_encode = {
-            "user_id": user.id,
-            "email": user.email,
-            "exp": expire
+            "sub": str(user.id),
+            "e": user.email,
+            "exp": int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
         }
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        # Payload já serializado: vai direto para a camada JWS, sem passar pelo PyJWT.encode
+        payload = orjson.dumps(to_encode)
+        encoded_jwt = _jws.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     except Exception as e:
-        print(f"Erro ao criar token JWT: {e}")
+        logger.error(f"Erro ao criar token JWT: {e}")
         raise
 
-def verify_token(token: str) -> Optional[dict]:
+@dataclass(frozen=True, slots=True)
+class TokenData:
+    """Claims de um JWT já verificado"""
+    user_id: int
+    email: Optional[str]
+    exp: int
+
+def verify_token(token: str) -> Optional[TokenData]:
     """
     Verifica e decodifica JWT token
     
@@ -41,41 +135,173 @@ def verify_token(token: str) -> Optional[dict]:
         token (str): JWT token a ser verificado
     
     Returns:
-        Optional[dict]: Payload decodificado ou None se inválido
+        Optional[TokenData]: Claims do token ou None se inválido
     """
     try:
         if not token:
             return None
             
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _fast_verify_hs256(token)
+        if not isinstance(payload, dict):
+            return None
         
-        # Verificar se o token expirou
+        # Verificar se o token expirou (a camada JWS não valida claims)
         exp_timestamp = payload.get("exp")
-        if exp_timestamp is None:
+        if not isinstance(exp_timestamp, (int, float)):
             return None
             
-        exp_datetime = datetime.fromtimestamp(exp_timestamp)
-        if datetime.utcnow() > exp_datetime:
+        if exp_timestamp <= time.time():
+            logger.debug("Token JWT expirado")
+            return None
+        
+        sub = payload.get("sub")
+        if isinstance(sub, str) and sub.isascii() and sub.isdigit():
+            return TokenData(user_id=int(sub), email=payload.get("e"), exp=int(exp_timestamp))
+        
+        # Formato antigo ({"user_id", "email"}): aceito até os tokens já emitidos expirarem
+        user_id = payload.get("user_id")
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
             return None
             
-        return payload
+        return TokenData(user_id=user_id, email=payload.get("email"), exp=int(exp_timestamp))
         
-    except jwt.ExpiredSignatureError:
-        print("Token JWT expirado")
-        return None
     except jwt.InvalidTokenError:
-        print("Token JWT inválido")
+        logger.debug("Token JWT inválido")
         return None
     except Exception as e:
-        print(f"Erro ao verificar token: {e}")
+        logger.warning(f"Erro ao verificar token: {e}")
+        return None
+
+# Pool dedicado para tirar a verificação HMAC/base64 do event loop
+_VERIFY_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="jwt-verify")
+
+async def verify_token_async(token: str) -> Optional[TokenData]:
+    """
+    Versão assíncrona de verify_token para rotas async
+    
+    A decodificação roda no _VERIFY_POOL, liberando o event loop para
+    outras requests enquanto o token é verificado.
+    """
+    if not token:
         return None
+    return await asyncio.get_running_loop().run_in_executor(_VERIFY_POOL, verify_token, token)
+
+# Cliente HTTP compartilhado: conexões keep-alive (HTTP/2 quando h2 está instalado) reaproveitadas entre requests
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente httpx assíncrono único do processo (fechado no shutdown da aplicação)"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Userinfo do Google cacheado no Redis por hash do access token (nunca o token em claro)
+GOOGLE_USERINFO_TTL_SECONDS = 300
+
+def _google_userinfo_key(access_token: str) -> str:
+    return "goog:" + hashlib.sha256(access_token.encode()).hexdigest()
+
+# Cabeçalho de desafio das respostas 401 (RFC 6750), montado uma única vez e imutável
+_BEARER_CHALLENGE = MappingProxyType({"WWW-Authenticate": "Bearer"})
+_RATE_LIMITED_DETAIL = "Muitas requisições, tente novamente em instantes"
+
+def credentials_exception(detail: str = "Token inválido ou expirado") -> HTTPException:
+    """
+    401 com o desafio Bearer
+    
+    Uma instância nova por request: a exceção carrega traceback/contexto e
+    não deve ser compartilhada entre requisições concorrentes.
+    """
+    return HTTPException(status_code=401, detail=detail, headers=_BEARER_CHALLENGE)
+
+# Token bucket por (endpoint, identidade): capacidade de rajada e recarga em tokens/segundo
+RATE_LIMIT_CAPACITY = int(os.getenv("RATE_LIMIT_CAPACITY", "20"))
+RATE_LIMIT_REFILL_PER_SEC = float(os.getenv("RATE_LIMIT_REFILL_PER_SEC", "1"))
+
+# Atômico no Redis: recarrega pelo tempo decorrido (relógio do servidor Redis) e consome 1 token
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last_refill')
+local tokens = tonumber(bucket[1]) or capacity
+local last_refill = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last_refill) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'last_refill', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+_token_bucket = None
+
+def check_rate_limit(identity, endpoint: str) -> bool:
+    """
+    Consome um token do bucket rl:{endpoint}:{identity}
+    
+    Returns:
+        bool: False se o limite foi excedido. Sem Redis (ou com Redis fora do ar)
+        a requisição é liberada.
+    """
+    global _token_bucket
+    client = get_redis()
+    if client is None:
+        return True
+    try:
+        if _token_bucket is None:
+            _token_bucket = client.register_script(_TOKEN_BUCKET_LUA)
+        allowed = _token_bucket(
+            keys=[f"rl:{endpoint}:{identity}"],
+            args=[RATE_LIMIT_CAPACITY, RATE_LIMIT_REFILL_PER_SEC],
+        )
+        return bool(allowed)
+    except redis.RedisError as e:
+        logger.warning(f"Rate limit indisponível, liberando requisição: {e}")
+        return True
 
-async def verify_google_token(access_token: str) -> dict:
+def rate_limiter(endpoint: str):
+    """
+    Dependência FastAPI que responde 429 quando o bucket se esgota
+    
+    A identidade é o user_id do Bearer token, quando válido, ou o IP do cliente.
+    """
+    def dependency(request: Request):
+        identity = None
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            token_data = verify_token(token)
+            if token_data:
+                identity = f"user:{token_data.user_id}"
+        if identity is None:
+            identity = f"ip:{request.client.host if request.client else 'unknown'}"
+        
+        if not check_rate_limit(identity, endpoint):
+            raise HTTPException(status_code=429, detail=_RATE_LIMITED_DETAIL)
+    
+    return dependency
+
+async def verify_google_token(access_token: str, client_ip: Optional[str] = None) -> dict:
     """
     Verifica token do Google OAuth e retorna informações do usuário
     
     Args:
         access_token (str): Access token do Google OAuth
+        client_ip (str): IP do cliente, usado no rate limit (opcional)
     
     Returns:
         dict: Informações do usuário do Google
@@ -83,11 +309,24 @@ async def verify_google_token(access_token: str) -> dict:
     Raises:
         Exception: Se a verificação falhar
     """
+    if client_ip and not await run_in_threadpool(check_rate_limit, f"ip:{client_ip}", "google_userinfo"):
+        raise Exception("Limite de tentativas de login excedido")
+    
+    # Cliente Redis síncrono: get/set vão para o threadpool para não travar o event loop
+    client = get_redis()
+    cache_key = _google_userinfo_key(access_token)
+    if client is not None:
+        try:
+            cached = await run_in_threadpool(client.get, cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
+        except redis.RedisError as e:
+            logger.warning(f"Falha ao ler userinfo do Redis: {e}")
+    
     try:
-        response = requests.get(
+        response = await get_http_client().get(
             "https://www.googleapis.com/oauth2/v3/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=10
+            headers={"Authorization": f"Bearer {access_token}"}
         )
         
         if response.status_code != 200:
@@ -102,16 +341,24 @@ async def verify_google_token(access_token: str) -> dict:
             if field not in user_info:
                 raise Exception(f"Campo obrigatório '{field}' não encontrado na resposta do Google")
         
-        return {
+        result = {
             "email": user_info["email"],
             "name": user_info["name"],
             "google_id": user_info["sub"],
             "picture": user_info.get("picture")
         }
         
-    except requests.exceptions.Timeout:
+        if client is not None:
+            try:
+                await run_in_threadpool(client.set, cache_key, orjson.dumps(result), ex=GOOGLE_USERINFO_TTL_SECONDS)
+            except redis.RedisError as e:
+                logger.warning(f"Falha ao gravar userinfo no Redis: {e}")
+        
+        return result
+        
+    except httpx.TimeoutException:
         raise Exception("Timeout ao conectar com Google OAuth")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise Exception(f"Erro de rede ao verificar token Google: {str(e)}")
     except Exception as e:
         raise Exception(f"Erro ao verificar token Google: {str(e)}")
@@ -126,8 +373,62 @@ def log_auth_attempt(email: str, success: bool, ip: str):
         ip (str): Endereço IP do cliente
     """
     status = "SUCESSO" if success else "FALHA"
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(f"AUTH {status} - Email: {email} - IP: {ip} - Time: {timestamp}")
+    # Só enfileira: a escrita acontece na thread do QueueListener (app.logging_config)
+    auth_logger.info(f"AUTH {status} - Email: {email} - IP: {ip}", extra={"email": email, "ok": success, "ip": ip})
+
+# Snapshot das colunas do usuário por (user_id, email): evita um SELECT por request autenticada
+_USER_CACHE = TTLCache(maxsize=10000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+def get_cached_user(session, user_id: int, email: Optional[str] = None):
+    """
+    Retorna o User do token anexado à sessão, consultando o banco só em cache miss
+    
+    O cache guarda apenas os valores das colunas; no hit o objeto é reconstruído e
+    anexado com merge(load=False), sem round trip ao banco.
+    """
+    key = (user_id, email)
+    with _user_cache_lock:
+        data = _USER_CACHE.get(key)
+    
+    if data is not None:
+        user = User(**data)
+        make_transient_to_detached(user)
+        return session.merge(user, load=False)
+    
+    user = session.get(User, user_id)
+    if user is None or (email is not None and user.email != email):
+        return user
+    
+    with _user_cache_lock:
+        _USER_CACHE[key] = {column: getattr(user, column) for column in User.__table__.columns.keys()}
+    return user
+
+# Checagem de identidade: só id/email pela PK, statement montado uma vez (o SQL compilado fica no cache do engine)
+_IDENTITY_STMT = select(User.id, User.email).where(User.id == bindparam("uid"))
+_IDENTITY_CACHE = TTLCache(maxsize=10000, ttl=60)
+
+def user_identity_exists(session, user_id: int, email: Optional[str]) -> bool:
+    """Confere se o usuário do token ainda existe (e com o mesmo email), sem carregar a linha inteira"""
+    key = (user_id, email)
+    with _user_cache_lock:
+        if key in _IDENTITY_CACHE or key in _USER_CACHE:
+            return True
+    
+    row = session.execute(_IDENTITY_STMT, {"uid": user_id}).first()
+    if row is None or (email is not None and row.email != email):
+        return False
+    
+    with _user_cache_lock:
+        _IDENTITY_CACHE[key] = True
+    return True
+
+def forget_cached_user(user_id: int):
+    """Descarta o usuário cacheado (chamar sempre que o registro for alterado)"""
+    with _user_cache_lock:
+        for cache in (_USER_CACHE, _IDENTITY_CACHE):
+            for key in [k for k in cache.keys() if k[0] == user_id]:
+                cache.pop(key, None)
 
 def get_current_user_from_token(token: str, session):
     """
@@ -140,78 +441,47 @@ def get_current_user_from_token(token: str, session):
     Returns:
         User: Objeto User ou None se não encontrado
     """
-    from .models import User
-    
-    payload = verify_token(token)
-    if not payload:
-        return None
-        
-    user_id = payload.get("user_id")
-    if not user_id:
+    token_data = verify_token(token)
+    if not token_data:
         return None
         
     try:
-        user = session.get(User, user_id)
-        return user
+        return get_cached_user(session, token_data.user_id, token_data.email)
     except Exception as e:
-        print(f"Erro ao buscar usuário: {e}")
+        logger.error(f"Erro ao buscar usuário: {e}")
         return None
 
-# Função de compatibilidade para manter o código existente
-def get_current_user(session, token: str = None):
-    """
-    Função de compatibilidade para Depends do FastAPI
-    
-    Args:
-        session: Sessão do banco de dados
-        token (str): JWT token (opcional)
-    
-    Returns:
-        User: Objeto User
-    """
-    from fastapi import HTTPException, Depends
-    from .db import get_session
-    
-    if token is None:
-        # Para uso com Depends
-        async def dependency(sess: Session = Depends(get_session), token: str = Depends(verify_token_from_header)):
-            return get_current_user_from_token(token, sess)
-        return Depends(dependency)
-    else:
-        # Para uso direto
-        user = get_current_user_from_token(token, session)
-        if not user:
-            raise HTTPException(status_code=401, detail="Token inválido ou expirado")
-        return user
+# Extrai "Authorization: Bearer <token>"; sem auto_error para responder 401 (e não 403) sem header
+_bearer_scheme = HTTPBearer(auto_error=False)
 
-async def verify_token_from_header(request):
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_scheme)
+) -> TokenData:
     """
-    Extrai e verifica token do header Authorization
-    
-    Args:
-        request: Request do FastAPI
+    Dependência FastAPI: claims do JWT do header Authorization
     
     Returns:
-        str: Token se válido
+        TokenData: Claims verificadas (user_id, email, exp)
     
     Raises:
-        HTTPException: Se o token for inválido ou não fornecido
+        HTTPException: 401 se o token não foi enviado, é inválido ou expirou
     """
-    from fastapi import HTTPException
+    if credentials is None:
+        raise credentials_exception("Token de autorização não fornecido")
     
-    authorization = request.headers.get("Authorization")
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Token de autorização não fornecido")
-    
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise HTTPException(status_code=401, detail="Esquema de autenticação inválido")
-        
-        if not verify_token(token):
-            raise HTTPException(status_code=401, detail="Token inválido ou expirado")
-            
-        return token
-        
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Header Authorization mal formatado")
\ No newline at end of file
+    token_data = await verify_token_async(credentials.credentials)
+    if not token_data:
+        raise credentials_exception()
+    return token_data
+
+def get_current_identity(
+    token_data: TokenData = Depends(get_current_user),
+    session=Depends(get_session)
+) -> TokenData:
+    """
+    Como get_current_user, mas também rejeita tokens de usuários removidos
+    (ou cujo email mudou) com uma consulta enxuta por PK, cacheada por 60s
+    """
+    if not user_identity_exists(session, token_data.user_id, token_data.email):
+        raise credentials_exception("Usuário não encontrado")
+    return token_data
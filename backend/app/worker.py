@@ -1,58 +1,191 @@
 import os
-import time
-import json
+import orjson
+import signal
+import asyncio
+import logging
 import redis
-from app.nlu.transcribe import transcribe_and_extract
+import redis.asyncio as aioredis
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from app.nlu.transcribe import transcribe_audio, extract_expense, TranscribeOut, InstallmentOut
 from app.db import SessionLocal
-from app.models import Expense, Installment
-from datetime import datetime
+from app.logging_config import setup_logging
+from app.models import Expense, Installment, CostCenter, Category, PaymentStatus
 
+logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-redis_client = redis.Redis.from_url(REDIS_URL)
-
-
-def save_result_to_db(result: dict, user_id: int):
-db = SessionLocal()
-try:
-exp = Expense(
-user_id=user_id,
-description=result.get('text'),
-total_amount=result.get('total_amount'),
-payment_method=result.get('payment_method'),
-category=result.get('category')
-)
-db.add(exp)
-db.commit()
-db.refresh(exp)
-for inst in result.get('installments', []):
-ins = Installment(
-expense_id=exp.id,
-amount=inst.get('amount'),
-due_date=inst.get('due_date'),
-status=inst.get('status', 'pending'),
-installment_number=inst.get('installment_number')
-)
-db.add(ins)
-db.commit()
-finally:
-db.close()
-
-
-def worker_loop():
-print('Worker started, waiting for jobs...')
-while True:
-_, raw = redis_client.blpop('transcribe_queue')
-job = json.loads(raw)
-audio_path = job.get('audio_path')
-user_id = job.get('user_id', 1)
-try:
-result = transcribe_and_extract(audio_path)
-save_result_to_db(result, user_id)
-except Exception as e:
-print('Error processing job:', e)
-time.sleep(0.1)
+QUEUE_NAME = 'transcribe_queue'
+# Jobs que falharam (ASR, áudio ausente, erro no banco) ficam aqui em vez de serem descartados
+DLQ_NAME = 'transcribe_queue_dlq'
+BLPOP_TIMEOUT = 5
+MAX_BACKOFF_SECONDS = 30
+
+# Consumidores concorrentes: enquanto um grava no banco, outro já está transcrevendo
+CONSUMERS = max(1, int(os.getenv('VE_WORKER_CONSUMERS', '4')))
+# Máximo de jobs trazidos do Redis por round trip (BLPOP + LPOP count)
+FETCH_BATCH = 16
+
+# Transcrição e gravação são síncronas; rodam fora do event loop
+_executor = ThreadPoolExecutor(max_workers=CONSUMERS, thread_name_prefix='worker')
+
+
+def load_user_names(db, user_id: int):
+    """Mapas nome -> id dos centros de custo e categorias do usuário"""
+    cost_centers = dict(db.execute(
+        select(CostCenter.name, CostCenter.id).where(CostCenter.user_id == user_id)
+    ).all())
+    categories = dict(db.execute(
+        select(Category.name, Category.id).where(Category.user_id == user_id)
+    ).all())
+    return cost_centers, categories
+
+
+def save_result_to_db(db, result: TranscribeOut, user_id: int, cost_centers: dict, categories: dict):
+    """Grava despesa e parcelas numa única transação (um flush para o id, um commit)"""
+    cost_center_id = cost_centers.get(result.cost_center)
+    category_id = categories.get(result.category)
+    if cost_center_id is None or category_id is None:
+        raise ValueError(f"Centro de custo/categoria não encontrados para o usuário {user_id}")
+
+    try:
+        exp = Expense(
+            user_id=user_id,
+            description=result.text,
+            total_amount=result.total_amount,
+            payment_method=result.payment_method,
+            cost_center_id=cost_center_id,
+            category_id=category_id,
+            is_installment=len(result.installments) > 1,
+            installments_count=len(result.installments) or 1
+        )
+        db.add(exp)
+        db.flush()  # gera exp.id sem commit nem SELECT extra
+
+        # Sem parcelas futuras (pix, débito...): parcela única, como em POST /api/expenses
+        installments = result.installments or [InstallmentOut(
+            amount=exp.total_amount, due_date=exp.transaction_date, installment_number=1
+        )]
+        # add_all + flush: o SQLAlchemy agrupa os INSERTs das parcelas num único executemany
+        db.add_all([
+            Installment(
+                expense_id=exp.id,
+                amount=inst.amount,
+                due_date=inst.due_date,
+                status=PaymentStatus(inst.status),
+                installment_number=inst.installment_number,
+                month_reference=inst.due_date.strftime("%Y-%m")
+            )
+            for inst in installments
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def process_job(db, raw: bytes):
+    """Transcreve o áudio do job e grava a despesa (executa em thread do _executor)"""
+    job = orjson.loads(raw)
+    audio_path = job.get('audio_path')
+    user_id = job.get('user_id', 1)
+    cost_centers, categories = load_user_names(db, user_id)
+    # Encerra a transação de leitura antes da transcrição, que é demorada
+    db.commit()
+    # Sem transcribe_and_extract: ele troca qualquer erro pelo fallback (R$ 0), que seria
+    # gravado como despesa. Aqui a falha sobe para o consumidor e o job vai para a DLQ.
+    with open(audio_path, 'rb') as f:
+        raw_text = transcribe_audio(f.read())
+    result = extract_expense(raw_text, list(cost_centers), list(categories))
+    save_result_to_db(db, result, user_id, cost_centers, categories)
+
+
+async def fetch_jobs(client: aioredis.Redis, jobs: asyncio.Queue, stop: asyncio.Event):
+    """Lê a fila do Redis em lotes e distribui os jobs para os consumidores"""
+    attempt = 0
+    while not stop.is_set():
+        try:
+            # BLPOP com timeout: sem job, volta a cada BLPOP_TIMEOUT segundos para checar o shutdown
+            popped = await client.blpop(QUEUE_NAME, timeout=BLPOP_TIMEOUT)
+            if popped is None:
+                continue
+            batch = [popped[1]]
+            # Aproveita o round trip seguinte para trazer o que mais houver na fila,
+            # até as vagas livres no buffer
+            room = min(FETCH_BATCH, jobs.maxsize) - 1 - jobs.qsize()
+            if room > 0:
+                batch.extend(await client.lpop(QUEUE_NAME, room) or [])
+            attempt = 0
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            # Redis fora do ar: backoff exponencial em vez de girar o loop em erro
+            delay = min(2 ** attempt, MAX_BACKOFF_SECONDS)
+            attempt += 1
+            logger.warning(f'⚠️ Redis indisponível ({e}), nova tentativa em {delay}s')
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        for raw in batch:
+            await jobs.put(raw)
+
+
+async def dead_letter(client: aioredis.Redis, raw: bytes, error: Exception):
+    """Guarda o job que falhou na DLQ (payload original, para reprocessar com RPUSH de volta na fila)"""
+    try:
+        await client.rpush(DLQ_NAME, raw)
+    except redis.RedisError as e:
+        logger.error(f'❌ Job perdido: falha ao enviar para a DLQ ({e}); erro original: {error}')
+
+
+async def consumer(worker_id: int, client: aioredis.Redis, jobs: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    # Uma sessão por consumidor, reaproveitada entre jobs (recriada após erro).
+    # O consumidor espera cada job terminar, então a sessão nunca é usada por duas threads ao mesmo tempo.
+    db = SessionLocal()
+    try:
+        while True:
+            raw = await jobs.get()
+            try:
+                if raw is None:  # sentinela de shutdown
+                    return
+                await loop.run_in_executor(_executor, process_job, db, raw)
+            except Exception as e:
+                logger.error(f'❌ Consumidor {worker_id}: erro ao processar job, enviado para {DLQ_NAME}: {e}')
+                await dead_letter(client, raw, e)
+                db.close()
+                db = SessionLocal()
+            finally:
+                jobs.task_done()
+    finally:
+        db.close()
+
+
+async def worker_loop():
+    client = aioredis.Redis.from_url(REDIS_URL)
+    # Buffer pequeno: jobs ficam no Redis até haver consumidor livre
+    jobs = asyncio.Queue(maxsize=CONSUMERS)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f'🚀 Worker iniciado com {CONSUMERS} consumidores, aguardando jobs...')
+    consumers = [asyncio.create_task(consumer(i, client, jobs)) for i in range(CONSUMERS)]
+    try:
+        await fetch_jobs(client, jobs, stop)
+        # Shutdown: consumidores terminam os jobs já buscados e saem na sentinela
+        logger.info('🛑 Encerrando worker, aguardando jobs em andamento...')
+        for _ in consumers:
+            await jobs.put(None)
+        await asyncio.gather(*consumers)
+    finally:
+        for task in consumers:
+            task.cancel()
+        await client.aclose()
+        _executor.shutdown(wait=False)
 
 
 if __name__ == '__main__':
-worker_loop()
\ No newline at end of file
+    setup_logging(logging.INFO)
+    asyncio.run(worker_loop())
@@ -0,0 +1,101 @@
+# backend/tests/test_worker.py
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+
+# Banco SQLite isolado: precisa estar definido antes de importar app.db
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'worker_test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from sqlalchemy import select, func
+
+from app import worker
+from app.db import SessionLocal, init_db
+from app.models import User, CostCenter, Category, Expense
+
+
+class FakeRedis:
+    """Só o que o consumidor usa: RPUSH na DLQ"""
+
+    def __init__(self):
+        self.lists = {}
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+
+class ConsumerDeadLetterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+        with SessionLocal() as db:
+            user = User(email="worker@teste.com", name="Worker")
+            db.add(user)
+            db.flush()
+            db.add_all([
+                CostCenter(name="Pessoal", user_id=user.id, is_personal=True),
+                Category(name="Alimentação", user_id=user.id),
+            ])
+            db.commit()
+            cls.user_id = user.id
+
+        audio = tempfile.NamedTemporaryFile(suffix=".webm", dir=_tmpdir.name, delete=False)
+        audio.write(b"audio")
+        audio.close()
+        cls.audio_path = audio.name
+
+    def setUp(self):
+        self._transcribe_audio = worker.transcribe_audio
+
+    def tearDown(self):
+        worker.transcribe_audio = self._transcribe_audio
+
+    def _expense_count(self):
+        with SessionLocal() as db:
+            return db.execute(
+                select(func.count(Expense.id)).where(Expense.user_id == self.user_id)
+            ).scalar_one()
+
+    def _run_consumer(self, raw):
+        client = FakeRedis()
+
+        async def run():
+            jobs = asyncio.Queue()
+            await jobs.put(raw)
+            await jobs.put(None)  # sentinela de shutdown
+            await worker.consumer(0, client, jobs)
+
+        asyncio.run(run())
+        return client
+
+    def test_asr_failure_goes_to_dlq_without_saving_expense(self):
+        def failing_asr(audio_bytes):
+            raise RuntimeError("modelo indisponível")
+
+        worker.transcribe_audio = failing_asr
+        before = self._expense_count()
+        raw = orjson.dumps({"audio_path": self.audio_path, "user_id": self.user_id})
+
+        client = self._run_consumer(raw)
+
+        self.assertEqual(client.lists.get(worker.DLQ_NAME), [raw])
+        self.assertEqual(self._expense_count(), before)
+
+    def test_successful_job_saves_expense(self):
+        worker.transcribe_audio = lambda audio_bytes: "gastei 45 reais no pix com almoço"
+        before = self._expense_count()
+        raw = orjson.dumps({"audio_path": self.audio_path, "user_id": self.user_id})
+
+        client = self._run_consumer(raw)
+
+        self.assertNotIn(worker.DLQ_NAME, client.lists)
+        self.assertEqual(self._expense_count(), before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()